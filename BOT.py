@@ -1,31 +1,240 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher, types
+import signal
+import sys
+from functools import lru_cache
+from aiogram import Dispatcher, types
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.utils import executor
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.webhook import AnswerInlineQuery, SendMessage
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from aiogram.types import ChatMemberUpdated, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
+from aiogram.types import ChatMemberUpdated, BotCommand, InputMediaPhoto, InlineQueryResultArticle, InputTextMessageContent
+from aiogram.utils.exceptions import BadRequest, MessageNotModified
 
-# Завантажимо налаштування
-load_dotenv()
+from bounded_storage import BoundedMemoryStorage
+from broadcast import Broadcaster
+from calorie_core import (ACTIVITY_CODES, STEP_BY_NAME, STEPS, Profile, activity_factor, calculate_bmr,
+                          daily_calories, goal_calories, next_step, parse_answer, parse_calc_query,
+                          parse_profile_value, previous_step)
+from callback_router import CallbackRouter
+from food_diary import Entry, FoodDiary, parse_entry
+from food_index import normalize, open_index, parse_grams, parse_portion
+from image_cache import ImageCache
+from keyboards import KEYBOARDS, PROFILE_CHOICES, food_choice_keyboard, profile_keyboard
+from metrics import Metrics, MetricsMiddleware
+from send_queue import QueuedBot, SendQueue
+from sqlite_storage import SQLiteStorage
+from startup import StartupTimer, set_commands_once
+from update_queue import OffsetStore, UpdatePoller, UpdateQueue
+
+# Завантажимо налаштування. На fly.io усе приходить через змінні середовища,
+# тож python-dotenv імпортуємо лише коли файл .env справді є
+ENV_FILE = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 API_TOKEN = os.getenv("TELEGRAM_TOKEN")
 if not API_TOKEN:
     raise RuntimeError("TELEGRAM_TOKEN is not set. Please create a .env file with TELEGRAM_TOKEN=<your token>")
 
-# Ініціалізація бота
-bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+# Режим роботи: polling для локальної розробки, webhook для розгортання на fly.io
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = WEBHOOK_HOST.rstrip('/') + WEBHOOK_PATH
+# Без явного секрету виводимо його з токена, щоб усі інстанси мали однаковий
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(API_TOKEN.encode()).hexdigest()
+# Скільки запитів вебхука Telegram тримає одночасно (1–100): кожен чекає на обробку свого оновлення
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", os.getenv("PORT", "8080")))
+
+# Каталог для локальних даних бота (кеш file_id, стани FSM тощо)
+BASE_DIR = os.path.dirname(__file__)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, 'data'))
+
+# Сховище станів: sqlite переживає перезапуски, bounded обмежує пам'ять
+# (сесії старші за FSM_TTL секунд і понад FSM_MAX_SESSIONS видаляються),
+# memory — для швидких локальних експериментів
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_TTL = int(os.getenv("FSM_TTL", 24 * 60 * 60))
+FSM_MAX_SESSIONS = int(os.getenv("FSM_MAX_SESSIONS", 100_000))
+
+# Щоденник харчування: межі дня і тижня рахуються в цьому часовому поясі
+DIARY_TZ = os.getenv("DIARY_TZ", "Europe/Kyiv")
+
+# Адміністратори, яким доступна команда /broadcast (id через кому)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(',') if x.strip()}
+
+# Локальний endpoint Prometheus /metrics; METRICS_PORT=0 вимикає збір метрик
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# Трейсинг оновлень: TRACE_SLOW_MS>0 вмикає його; оновлення, довші за поріг,
+# разом зі стеками семплера (раз на TRACE_SAMPLE_MS, 0 — без семплера) пишуться в TRACE_FILE
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 0))
+TRACE_SAMPLE_MS = float(os.getenv("TRACE_SAMPLE_MS", 5))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(DATA_DIR, 'slow_updates.jsonl'))
+
+# Інлайн-калькулятор: скільки різних запитів пам'ятати і скільки секунд Telegram
+# може сам віддавати відповідь на той самий запит, не звертаючись до бота
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", 4096))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 24 * 60 * 60))
+
+# Кроки анкети: edit — одне повідомлення, що редагується, classic — нове фото й текст на кожен крок
+WIZARD_MODE = os.getenv("WIZARD_MODE", "edit")
+
+# Адреса Bot API: власний сервер telegram-bot-api або локальна заглушка для навантажувальних тестів
+API_SERVER = os.getenv("TELEGRAM_API_SERVER")
+
+# Ліміт вихідних повідомлень на секунду для всього бота (Telegram дозволяє ~30)
+SEND_RATE = float(os.getenv("SEND_RATE", 30))
+# І для одного приватного чату (рекомендація Telegram — не частіше 1 на секунду)
+CHAT_SEND_RATE = float(os.getenv("CHAT_SEND_RATE", 1))
+
+# Обробка оновлень: не більше UPDATE_CONCURRENCY обробників одночасно і не більше
+# UPDATE_QUEUE_SIZE прийнятих оновлень; при зупинці (SIGTERM) прийняті доробляються
+# впродовж DRAIN_TIMEOUT секунд (на fly.io він має бути меншим за kill_timeout)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 32))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 25))
+
+# Шардування: SHARDS=N запускає процес-приймач і N воркерів, між якими
+# оновлення розподіляються за chat_id; SHARD_INDEX воркеру виставляє приймач
+SHARDS = int(os.getenv("SHARDS", 0))
+SHARD_INDEX = os.getenv("SHARD_INDEX")
+if SHARD_INDEX is not None:
+    # Кожен воркер має свою частку глобального ліміту надсилань і свій порт метрик
+    SEND_RATE /= SHARDS
+    if METRICS_PORT:
+        METRICS_PORT += 1 + int(SHARD_INDEX)
+    # RotatingFileHandler не розрахований на кілька процесів, тож у кожного воркера свій файл
+    TRACE_FILE += f'.{SHARD_INDEX}'
+
+# Ініціалізація бота: усі надсилання проходять через чергу з лімітами Telegram
+bot = QueuedBot(
+    token=API_TOKEN,
+    send_queue=SendQueue(rate=SEND_RATE, chat_rate=CHAT_SEND_RATE),
+    server=TelegramAPIServer.from_base(API_SERVER) if API_SERVER else TELEGRAM_PRODUCTION,
+)
+if FSM_STORAGE == 'memory':
+    storage = MemoryStorage()
+elif FSM_STORAGE == 'bounded':
+    storage = BoundedMemoryStorage(ttl=FSM_TTL, max_sessions=FSM_MAX_SESSIONS)
+else:
+    storage = SQLiteStorage(os.path.join(DATA_DIR, 'fsm.sqlite3'))
 dp = Dispatcher(bot, storage=storage)
+# Воркери шардів ділять файл щоденника: кеш перевіряється на чужі записи
+diary = FoodDiary(os.path.join(DATA_DIR, 'diary.sqlite3'), DIARY_TZ, shared=bool(SHARDS))
+# Таблиця калорійності продуктів і її пошуковий індекс (збирається при першому запуску)
+foods = open_index(os.path.join(BASE_DIR, 'foods', 'foods.csv'), os.path.join(DATA_DIR, 'foods.idx'))
+
+# Метрики: затримки обробників і викликів Bot API, типи оновлень, воронка Form
+metrics = Metrics()
+
+def collect_runtime_metrics():
+    queue = bot.send_queue.stats()
+    collected = [
+        ('send_queue_depth', 'gauge', 'Messages waiting for the global rate limit', queue['queue_depth']),
+        ('send_queue_waiting_for_chat', 'gauge', 'Messages waiting for a per-chat rate limit', queue['waiting_for_chat']),
+        ('send_queue_sent_total', 'counter', 'Messages sent through the queue', queue['sent']),
+        ('send_queue_retries_total', 'counter', 'RetryAfter retries', queue['retries']),
+        ('send_queue_wait_seconds_total', 'counter', 'Total time spent waiting in the queue', queue['wait_seconds_total']),
+        ('send_queue_wait_seconds_max', 'gauge', 'Longest wait in the queue', queue['wait_seconds_max']),
+    ]
+    if isinstance(storage, BoundedMemoryStorage):
+        collected += [
+            ('fsm_sessions', 'gauge', 'FSM sessions in memory', len(storage.sessions)),
+            ('fsm_evicted_ttl_total', 'counter', 'FSM sessions expired by TTL', storage.evicted_ttl),
+            ('fsm_evicted_lru_total', 'counter', 'FSM sessions evicted by the size cap', storage.evicted_lru),
+        ]
+    inline = calc_results.cache_info()
+    collected += [
+        ('inline_calc_cache_hits_total', 'counter', 'Inline calculations answered from the cache', inline.hits),
+        ('inline_calc_cache_misses_total', 'counter', 'Inline calculations computed', inline.misses),
+        ('inline_calc_cache_size', 'gauge', 'Inline calculations in the cache', inline.currsize),
+    ]
+    return collected
+
+# Трейсинг встановлюється першим, щоб трейс охоплював і решту middleware
+tracer = None
+if TRACE_SLOW_MS:
+    from tracing import TracingMiddleware
+
+    tracer = TracingMiddleware(TRACE_FILE, slow=TRACE_SLOW_MS / 1000, sample_interval=TRACE_SAMPLE_MS / 1000)
+    dp.middleware.setup(tracer)
+
+# Холодний старт: час до готовності і до першого обробленого оновлення
+startup = StartupTimer()
+dp.middleware.setup(startup)
+
+if METRICS_PORT:
+    dp.middleware.setup(MetricsMiddleware(metrics))
+    metrics.instrument_bot(bot)
+    metrics.add_collector(collect_runtime_metrics)
+    metrics.add_collector(startup.collect)
+
+# Команди меню; setMyCommands викликається лише коли список змінився
+BOT_COMMANDS = [
+    BotCommand(command="start", description="Почнемо"),
+    BotCommand(command="eat", description="Записати їжу"),
+    BotCommand(command="today", description="Підсумок дня"),
+    BotCommand(command="food", description="Калорійність продуктів"),
+]
+
+async def set_commands():
+    await set_commands_once(bot, BOT_COMMANDS, os.path.join(DATA_DIR, 'commands.sha1'))
+
+# Прогрів після старту: зображення в пам'ять і з'єднання з Bot API,
+# щоб перша відповідь не чекала ні диска, ні TLS-рукостискання.
+# bot.me кешується: у режимі вебхука executor уже викликав getMe, тож там це не коштує запиту
+async def preload_images():
+    await images.preload()
+
+async def warm_connection():
+    await bot.me
+
+# Запуск і зупинка спільні для всіх режимів; warm_steps — фонові кроки прогріву режиму
+async def start_services(*warm_steps):
+    if METRICS_PORT:
+        await metrics.serve(METRICS_HOST, METRICS_PORT)
+    if broadcaster.runner:
+        broadcaster.start_watching()
+    if tracer:
+        tracer.start_sampler()
+    startup.warm_up(*warm_steps)
+    startup.mark_ready()
+
+# close_bot=False — сховище FSM і сесію бота закриє executor (режим вебхука)
+async def stop_services(close_bot=True):
+    await startup.stop()
+    await broadcaster.close()
+    await diary.close()
+    if close_bot:
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        await (await bot.get_session()).close()
 
-# Встановлюємо команду меню «Почнемо»
 async def on_startup(dp: Dispatcher):
-    await bot.set_my_commands([
-        BotCommand(command="start", description="Почнемо"),
-    ])
+    await start_services(preload_images, warm_connection, set_commands)
+
+async def on_shutdown(dp: Dispatcher):
+    await stop_services(close_bot=False)
+
+# У режимі вебхука реєструємо адресу разом із секретним токеном
+async def register_webhook():
+    await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET, max_connections=WEBHOOK_MAX_CONNECTIONS)
+
+async def on_startup_webhook(dp: Dispatcher):
+    # Telegram повторює доставку, доки вебхук не відповість, тож реєструємо його у фоні
+    await start_services(register_webhook, preload_images, warm_connection, set_commands)
 
 # Шляхи до локальних зображень
-BASE_DIR = os.path.dirname(__file__)
 IMAGE_PATHS = {
     'welcome': os.path.join(BASE_DIR, 'images', 'welcome.jpg'),
     'goal': os.path.join(BASE_DIR, 'images', 'goal.jpg'),
@@ -37,253 +246,481 @@ IMAGE_PATHS = {
     'result': os.path.join(BASE_DIR, 'images', 'result.jpg')
 }
 
+# Зображення завантажуються в Telegram один раз, далі надсилаються за file_id
+images = ImageCache(IMAGE_PATHS, os.path.join(DATA_DIR, 'file_ids.json'))
+
+# Розсилки «новин і порад» усім, хто запускав бота; у шардованому режимі їх виконує воркер 0
+broadcaster = Broadcaster(os.path.join(DATA_DIR, 'broadcast.sqlite3'), bot, images, KEYBOARDS,
+                          runner=SHARD_INDEX in (None, '0'))
+
+if tracer:
+    tracer.instrument(bot=bot, storage=storage, images=images, extra=[
+        (diary, 'storage', ('add', 'totals', 'target', 'set_target', 'profile', 'save_profile')),
+        (broadcaster, 'storage', ('remember_chat', 'forget_chat')),
+    ])
+
+# Обробники повертають останнє повідомлення як SendMessage: у режимі вебхука
+# воно йде прямо у відповіді на запит Telegram без окремого HTTP-запиту,
+# у режимі polling aiogram надсилає його сам.
+
+WELCOME_CAPTION = "Вітаю в моєму телеграм-боті. Тут ти зможеш підрахувати кількість калорій та отримувати актуальні новини та поради"
+WELCOME_FALLBACK = "Вітаю в боті! Тут ти зможеш підрахувати калорії та отримувати новини."
+START_PROMPT = "Натисни кнопку, щоб розпочати:"
+
 # Вітальне повідомлення при першому відкритті чату
 @dp.chat_member_handler()
 async def welcome_new_user(chat_member: ChatMemberUpdated):
     if chat_member.chat.type == 'private' and chat_member.new_chat_member.status == 'member':
         chat_id = chat_member.chat.id
+        await broadcaster.remember_chat(chat_id)
+        if WIZARD_MODE == 'edit':
+            await send_wizard(chat_id, 'welcome', f"{WELCOME_CAPTION}\n\n{START_PROMPT}", KEYBOARDS['start'])
+            return
         try:
-            with open(IMAGE_PATHS['welcome'], 'rb') as img:
-                await bot.send_photo(chat_id, img,
-                    caption="Вітаю в моєму телеграм-боті. Тут ти зможеш підрахувати кількість калорій та отримувати актуальні новини та поради"
-                )
+            await images.send_photo(bot, chat_id, 'welcome', caption=WELCOME_CAPTION)
         except FileNotFoundError:
-            await bot.send_message(chat_id,
-                "Вітаю в боті! Тут ти зможеш підрахувати калорії та отримувати новини.")
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton("🚀 Почнемо", callback_data="start_calc"))
-        await bot.send_message(chat_id, "Натисни кнопку, щоб розпочати:", reply_markup=kb)
-
-# Стани FSM
-class Form(StatesGroup):
-    goal = State()
-    gender = State()
-    age = State()
-    height = State()
-    weight = State()
-    activity = State()
-
-# Розрахункові функції
-def calculate_bmr(weight, height, age, gender):
-    return 9.99 * weight + 6.25 * height - 4.92 * age + (5 if gender=='male' else -161)
-
-def activity_factor(code):
-    factors = {'1.2':1.2, '1.375':1.375, '1.55':1.55, '1.725':1.725, '1.9':1.9}
-    return factors.get(code)
+            await bot.send_message(chat_id, WELCOME_FALLBACK)
+        return SendMessage(chat_id, START_PROMPT, reply_markup=KEYBOARDS['start'])
+
+# Стани FSM — по одному на крок анкети з calorie_core (Form:goal, Form:gender, ...)
+Form = type('Form', (StatesGroup,), {step.name: State() for step in STEPS})
+
+GOAL_PURPOSES = {'loss': 'для схуднення', 'maintain': 'для підтримки', 'gain': 'для набору'}
+
+# Показ кроку анкети.
+# edit (типово): усі кроки живуть в одному повідомленні-майстрі — фото з
+# підписом і клавіатурою, яке редагується через edit_message_media. Для
+# текстових кроків (вік, зріст, вага) його id береться з даних FSM.
+# classic: на кожен крок нове фото і окреме повідомлення з клавіатурою.
+async def send_wizard(chat_id, image, caption, reply_markup):
+    try:
+        return await images.send_photo(bot, chat_id, image, caption=caption, reply_markup=reply_markup)
+    except FileNotFoundError:
+        return await bot.send_message(chat_id, caption, reply_markup=reply_markup)
+
+async def edit_wizard(msg: types.Message, state: FSMContext, image, caption, reply_markup):
+    if msg.from_user and msg.from_user.id == bot.id:
+        message_id = msg.message_id
+    else:
+        message_id = (await state.get_data()).get('wizard_message_id')
+    if message_id:
+        try:
+            await images.send(image, lambda photo: bot.edit_message_media(
+                InputMediaPhoto(photo, caption=caption), msg.chat.id, message_id, reply_markup=reply_markup))
+        except MessageNotModified:
+            pass
+        except FileNotFoundError:
+            await bot.edit_message_caption(msg.chat.id, message_id, caption=caption, reply_markup=reply_markup)
+        except BadRequest:
+            # Повідомлення видалене або надто старе для редагування — надішлемо нове
+            message_id = None
+    if not message_id:
+        message_id = (await send_wizard(msg.chat.id, image, caption, reply_markup)).message_id
+    await state.update_data(wizard_message_id=message_id)
+
+async def render_step(msg: types.Message, state: FSMContext, image):
+    # Зображення і клавіатура кроку мають ту саму назву, що й крок анкети
+    text = STEP_BY_NAME[image].prompt
+    if WIZARD_MODE == 'edit':
+        await edit_wizard(msg, state, image, text, KEYBOARDS[image])
+        return
+    try:
+        await images.send_photo(bot, msg.chat.id, image)
+    except FileNotFoundError:
+        pass
+    return SendMessage(msg.chat.id, text, reply_markup=KEYBOARDS[image])
+
+# Кнопки маршрутизуються за (станом, префіксом callback_data) через словник;
+# маршрутизатор сам відповідає на callback після обробника
+router = CallbackRouter()
 
 # Обробник «На початок»
-@dp.callback_query_handler(lambda c: c.data=='home', state='*')
-async def go_home(callback: types.CallbackQuery, state: FSMContext):
-    await callback.answer()
-    await cmd_start(callback.message, state)
+@router.route('home')
+async def go_home(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    return await cmd_start(callback.message, state)
 
 # Стартова команда (/start)
 @dp.message_handler(commands=['start'], state='*')
 async def cmd_start(message: types.Message, state: FSMContext=None):
     if state:
         await state.finish()
+    if message.chat.type == 'private':
+        await broadcaster.remember_chat(message.chat.id)
+    if WIZARD_MODE == 'edit':
+        await edit_wizard(message, state, 'welcome', f"{WELCOME_CAPTION}\n\n{START_PROMPT}", KEYBOARDS['start'])
+        return
     try:
-        with open(IMAGE_PATHS['welcome'], 'rb') as img:
-            await bot.send_photo(message.chat.id, img,
-                caption="Вітаю в моєму телеграм-боті. Тут ти зможеш підрахувати кількість калорій та отримувати актуальні новини та поради")
-    except FileNotFoundError:
-        await message.answer("Вітаю в боті! Тут ти зможеш підрахувати калорії та отримувати новини.")
-    kb = InlineKeyboardMarkup()
-    kb.add(InlineKeyboardButton("🚀 Почнемо", callback_data="start_calc"))
-    await message.answer("Натисни кнопку, щоб розпочати:", reply_markup=kb)
-
-# Крок 1: вибір мети
-@dp.callback_query_handler(lambda c: c.data=='start_calc', state='*')
-async def process_start(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_goal(callback.message)
-    await Form.goal.set()
-
-async def show_goal(msg: types.Message):
-    try:
-        with open(IMAGE_PATHS['goal'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
-    except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup(row_width=1)
-    kb.add(
-        InlineKeyboardButton("Схуднути", callback_data="goal_loss"),
-        InlineKeyboardButton("Норма калорій", callback_data="goal_maintain"),
-        InlineKeyboardButton("Набрати", callback_data="goal_gain"),
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_goal"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Яка Ваша ціль?", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_goal', state=Form.goal)
-async def back_goal(callback: types.CallbackQuery, state: FSMContext):
-    await callback.answer()
-    await cmd_start(callback.message, state)
-
-@dp.callback_query_handler(lambda c: c.data.startswith('goal_'), state=Form.goal)
-async def process_goal(callback: types.CallbackQuery, state: FSMContext):
-    await callback.answer()
-    await state.update_data(goal=callback.data.split('_')[1])
-    await show_gender(callback.message)
-    await Form.gender.set()
-
-# Крок 2: стать
-async def show_gender(msg: types.Message):
-    try:
-        with open(IMAGE_PATHS['gender'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
-    except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup(row_width=2)
-    kb.add(
-        InlineKeyboardButton("Чоловік", callback_data="gender_male"),
-        InlineKeyboardButton("Жінка", callback_data="gender_female"),
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_gender"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Оберіть стать:", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_gender', state=Form.gender)
-async def back_gender(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_goal(callback.message)
-    await Form.goal.set()
-
-@dp.callback_query_handler(lambda c: c.data.startswith('gender_'), state=Form.gender)
-async def process_gender(callback: types.CallbackQuery, state: FSMContext):
-    await callback.answer()
-    await state.update_data(gender=callback.data.split('_')[1])
-    await show_age(callback.message)
-    await Form.age.set()
-
-# Крок 3: вік
-async def show_age(msg: types.Message):
-    try:
-        with open(IMAGE_PATHS['age'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
+        await images.send_photo(bot, message.chat.id, 'welcome', caption=WELCOME_CAPTION)
     except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup()
-    kb.add(
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_age"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Скільки Вам років?", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_age', state=Form.age)
-async def back_age(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_gender(callback.message)
-    await Form.gender.set()
-
-@dp.message_handler(lambda m: m.text.isdigit(), state=Form.age)
-async def process_age(message: types.Message, state: FSMContext):
-    await state.update_data(age=int(message.text))
-    await show_height(message)
-    await Form.height.set()
-
-# Крок 4: зріст
-async def show_height(msg: types.Message):
-    try:
-        with open(IMAGE_PATHS['height'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
-    except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup()
-    kb.add(
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_height"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Який Ваш зріст (см)?", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_height', state=Form.height)
-async def back_height(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_age(callback.message)
-    await Form.age.set()
-
-@dp.message_handler(lambda m: m.text.replace('.', '', 1).isdigit(), state=Form.height)
-async def process_height(message: types.Message, state: FSMContext):
-    await state.update_data(height=float(message.text))
-    await show_weight(message)
-    await Form.weight.set()
-
-# Крок 5: вага
-async def show_weight(msg: types.Message):
+        await message.answer(WELCOME_FALLBACK)
+    return SendMessage(message.chat.id, START_PROMPT, reply_markup=KEYBOARDS['start'])
+
+# Анкета: переходи між кроками беруться з STEPS (next_step / previous_step),
+# тож маршрути «далі» і «назад» реєструються циклом, а не окремою функцією
+# на кожен крок. Останній крок (активність) обробляє process_activity.
+@router.route('start')
+async def process_start(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    return await show_step(callback.message, state, STEPS[0].name)
+
+async def show_step(msg: types.Message, state: FSMContext, name):
+    # Перехід на крок name; None — назад на стартовий екран
+    if name is None:
+        return await cmd_start(msg, state)
+    await getattr(Form, name).set()
+    return await render_step(msg, state, name)
+
+async def go_back(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    # payload — назва поточного кроку: route пропускає лише кнопку «Назад» цього кроку
+    return await show_step(callback.message, state, previous_step(payload))
+
+def answer_handlers(name):
+    # Обробники відповіді на крок name: зберегти її і показати наступний крок
+    async def process_choice(callback: types.CallbackQuery, state: FSMContext, payload: str):
+        await state.update_data({name: payload})
+        return await show_step(callback.message, state, next_step(name))
+
+    async def process_text(message: types.Message, state: FSMContext):
+        await state.update_data({name: parse_answer(name, message.text)})
+        return await show_step(message, state, next_step(name))
+
+    # Назви обробників — це мітки метрик bot_handler_duration_seconds
+    process_choice.__name__ = process_text.__name__ = f'process_{name}'
+    return process_choice, process_text
+
+for step in STEPS:
+    router.route('back', state=getattr(Form, step.name), payloads=(step.name,))(go_back)
+    if next_step(step.name) is None:
+        continue
+    process_choice, process_text = answer_handlers(step.name)
+    if step.choices:
+        router.route(step.name, state=getattr(Form, step.name), payloads=step.choices)(process_choice)
+    else:
+        dp.register_message_handler(process_text, lambda m, name=step.name: parse_answer(name, m.text) is not None,
+                                    state=getattr(Form, step.name))
+
+@router.route('act', state=Form.activity, payloads=ACTIVITY_CODES)
+async def process_activity(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    data = await state.get_data()
+    profile = Profile(data['goal'], data['gender'], data['age'], data['height'], data['weight'], payload)
+    calories = daily_calories(profile)
+    purpose = GOAL_PURPOSES.get(data['goal'], GOAL_PURPOSES['gain'])
+    result = f"Ваша добова норма {purpose}: {calories:.0f} ккал."
+    # Відповіді анкети зберігаються для перерахунку, а норма стає ціллю щоденника харчування
+    await diary.save_profile(callback.from_user.id, profile, calories)
+    # Анкету закінчено до показу результату: наступне натискання вже не застане її стан
+    await state.finish()
+    if WIZARD_MODE == 'edit':
+        await edit_wizard(callback.message, state, 'result', f"{result}\n\nЩо бажаєте далі?", KEYBOARDS['result'])
+        return
     try:
-        with open(IMAGE_PATHS['weight'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
+        await images.send_photo(bot, callback.message.chat.id, 'result', caption=result)
     except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup()
-    kb.add(
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_weight"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Яка Ваша вага (кг)?", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_weight', state=Form.weight)
-async def back_weight(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_height(callback.message)
-    await Form.height.set()
-
-@dp.message_handler(lambda m: m.text.replace('.', '', 1).isdigit(), state=Form.weight)
-async def process_weight(message: types.Message, state: FSMContext):
-    await state.update_data(weight=float(message.text))
-    await show_activity(message)
-    await Form.activity.set()
-
-# Крок 6: активність
-async def show_activity(msg: types.Message):
+        await callback.message.reply(result)
+    return SendMessage(callback.message.chat.id, "Що бажаєте далі?", reply_markup=KEYBOARDS['result'])
+
+# Перерахунок: збережений профіль на одному екрані. Мета, стать і активність
+# змінюються кнопкою, вік, зріст і вага — повідомленням на кшталт «вага 78»;
+# норма перераховується одразу, а екран оновлюється одним редагуванням.
+class Recalc(StatesGroup):
+    editing = State()
+
+PROFILE_LABELS = {field: dict((value, text) for text, value in choices) for field, choices in PROFILE_CHOICES}
+PROFILE_EDITS = frozenset(f"{field}:{value}" for field, choices in PROFILE_CHOICES for _, value in choices)
+PROFILE_HINT = "Щоб змінити вік, зріст чи вагу, надішліть, наприклад: «вага 78», «зріст 181» або «вік 31»."
+
+def profile_text(profile, calories):
+    purpose = GOAL_PURPOSES.get(profile.goal, GOAL_PURPOSES['gain'])
+    return (f"Ваш профіль: {PROFILE_LABELS['gender'][profile.gender].lower()}, {profile.age} р., "
+            f"{profile.height:g} см, {profile.weight:g} кг, активність — "
+            f"{PROFILE_LABELS['activity'][profile.activity].lower()}.\n"
+            f"Добова норма {purpose}: {calories:.0f} ккал.\n\n{PROFILE_HINT}")
+
+async def render_profile(msg: types.Message, state: FSMContext, profile, calories):
+    await Recalc.editing.set()
+    text = profile_text(profile, calories)
+    reply_markup = profile_keyboard(profile.goal, profile.gender, profile.activity)
+    if WIZARD_MODE == 'edit':
+        await edit_wizard(msg, state, 'result', text, reply_markup)
+        return
+    return SendMessage(msg.chat.id, text, reply_markup=reply_markup)
+
+async def recalculate(msg: types.Message, state: FSMContext, user_id, profile):
+    calories = daily_calories(profile)
+    await diary.save_profile(user_id, profile, calories)
+    return await render_profile(msg, state, profile, calories)
+
+@router.route('recalc')
+async def show_recalc(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    profile = await diary.profile(callback.from_user.id)
+    if profile is None:
+        # Профілю ще немає (розрахунок був до його появи) — проходимо анкету
+        return await process_start(callback, state, payload)
+    return await render_profile(callback.message, state, profile, daily_calories(profile))
+
+@router.route('edit', payloads=PROFILE_EDITS)
+async def edit_profile_choice(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    profile = await diary.profile(callback.from_user.id)
+    if profile is None:
+        return await process_start(callback, state, payload)
+    field, _, value = payload.partition(':')
+    if getattr(profile, field) == value:
+        return
+    return await recalculate(callback.message, state, callback.from_user.id, profile._replace(**{field: value}))
+
+@dp.message_handler(lambda m: not m.is_command(), state=Recalc.editing)
+async def edit_profile_value(message: types.Message, state: FSMContext):
+    change = parse_profile_value(message.text)
+    profile = await diary.profile(message.from_user.id)
+    if profile is None:
+        return await cmd_start(message, state)
+    if change is None:
+        return SendMessage(message.chat.id, PROFILE_HINT)
+    field, value = change
+    return await recalculate(message, state, message.from_user.id, profile._replace(**{field: value}))
+
+# Щоденник харчування
+DIARY_USAGE = ("Запишіть їжу так: /eat гречка 250\nабо разом з БЖВ (г): /eat гречка 250 9 4 50\n"
+               "або порцію продукту з довідника: /eat гречка варена 150г")
+
+def diary_summary(day, week, target):
+    if target:
+        left = target - day.kcal
+        balance = f"залишилось {left:.0f}" if left >= 0 else f"перевищено на {-left:.0f}"
+        lines = [f"📒 Сьогодні: {day.kcal:.0f} з {target:.0f} ккал ({balance})"]
+    else:
+        lines = [f"📒 Сьогодні: {day.kcal:.0f} ккал"]
+    lines.append(f"Б/Ж/В: {day.protein:.0f} / {day.fat:.0f} / {day.carbs:.0f} г, записів: {day.count}")
+    week_line = f"За тиждень: {week.kcal:.0f} ккал"
+    if target:
+        week_line += f" з {target * 7:.0f}"
+    lines.append(week_line)
+    if not target:
+        lines.append("Добову норму ще не розраховано — натисніть /start, щоб дізнатися її.")
+    return "\n".join(lines)
+
+# Порція продукту з довідника: значення в ньому на 100 г
+def portion_entry(food, grams):
+    k = grams / 100
+    return Entry(f"{food.name_uk}, {grams:g} г", food.kcal * k, food.protein * k, food.fat * k, food.carbs * k)
+
+# Скільки продуктів пропонувати на вибір, коли назва порції неоднозначна
+EAT_CHOICES = 5
+
+async def add_entry(chat_id, user_id, entry):
+    day, week = await diary.add(user_id, entry)
+    target = await diary.target(user_id)
+    return SendMessage(chat_id, f"✅ {entry.name}: {entry.kcal:.0f} ккал\n\n{diary_summary(day, week, target)}")
+
+@dp.message_handler(commands=['eat'], state='*')
+async def cmd_eat(message: types.Message):
+    entry = parse_entry(message.get_args())
+    if entry is None:
+        portion = parse_portion(message.get_args())
+        if portion is None:
+            return SendMessage(message.chat.id, DIARY_USAGE)
+        query, grams = portion
+        found = foods.search(query, EAT_CHOICES)
+        if not found:
+            return SendMessage(message.chat.id, f"Не знайшов «{query}» у довіднику. Вкажіть калорії самі: /eat {query} 250")
+        # Без точного збігу назви не вгадуємо: «гречка» — це і суха (343 ккал), і варена (92)
+        if len(found) > 1 and normalize(query) not in (normalize(found[0].name_uk), normalize(found[0].name_en)):
+            choices = tuple((food.id, food.name_uk, food.kcal) for food in found)
+            return SendMessage(message.chat.id, f"Який саме продукт «{query}», {grams:g} г?",
+                               reply_markup=food_choice_keyboard(choices, grams))
+        entry = portion_entry(found[0], grams)
+    return await add_entry(message.chat.id, message.from_user.id, entry)
+
+@router.route('eat')
+async def eat_choice(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    food_id, _, grams = payload.partition(':')
+    grams = parse_grams(grams)
+    if not food_id.isdecimal() or int(food_id) >= len(foods) or grams is None:
+        return
+    entry = portion_entry(foods.get(int(food_id)), grams)
+    return await add_entry(callback.message.chat.id, callback.from_user.id, entry)
+
+@dp.message_handler(commands=['today'], state='*')
+async def cmd_today(message: types.Message):
+    day, week = await diary.totals(message.from_user.id)
+    target = await diary.target(message.from_user.id)
+    return SendMessage(message.chat.id, diary_summary(day, week, target))
+
+# Довідник калорійності: /food назва і інлайн-пошук @бот назва
+def food_line(food):
+    return (f"{food.name_uk} — {food.kcal:g} ккал, "
+            f"Б/Ж/В {food.protein:g} / {food.fat:g} / {food.carbs:g} г")
+
+@dp.message_handler(commands=['food'], state='*')
+async def cmd_food(message: types.Message):
+    query = message.get_args()
+    found = foods.search(query, 5) if query else []
+    if not found:
+        return SendMessage(message.chat.id, "Напишіть назву продукту: /food гречка" if not query
+                           else f"Не знайшов «{query}» у довіднику.")
+    lines = ["На 100 г:"] + [food_line(food) for food in found]
+    lines.append(f"\nЗаписати порцію: /eat {found[0].name_uk.lower()} 150г")
+    return SendMessage(message.chat.id, "\n".join(lines))
+
+def food_results(query):
+    # Вибраний результат надсилає в чат «/eat назва 100г», який бот записує в щоденник
+    return [
+        InlineQueryResultArticle(
+            id=str(food.id),
+            title=f"{food.name_uk} — {food.kcal:g} ккал / 100 г",
+            description=f"{food.name_en} · Б/Ж/В {food.protein:g} / {food.fat:g} / {food.carbs:g}",
+            input_message_content=InputTextMessageContent(f"/eat {food.name_uk} 100г"),
+        )
+        for food in foods.search(query, 10)
+    ]
+
+# Інлайн-калькулятор: «@бот 80 180 30 m 1.55 loss» — вага, зріст, вік (саме в
+# такому порядку), стать, активність і, за бажанням, мета. Усі три варіанти
+# норми приходять одразу, бажана мета — першою.
+CALC_HINT = "Формат: 80 180 30 m 1.55 loss"
+
+@lru_cache(maxsize=INLINE_CACHE_SIZE)
+def calc_results(weight, height, age, gender, activity, goal):
+    # Готовий JSON для answerInlineQuery: повторний запит не рахує і не серіалізує нічого
+    tdee = calculate_bmr(weight, height, age, gender) * activity_factor(activity)
+    params = (f"{weight:g} кг, {height:g} см, {age} р., {PROFILE_LABELS['gender'][gender].lower()}, "
+              f"активність — {PROFILE_LABELS['activity'][activity].lower()}")
+    results = []
+    for option in sorted(GOAL_PURPOSES, key=lambda option: option != goal):
+        calories = goal_calories(tdee, option)
+        text = f"Добова норма {GOAL_PURPOSES[option]}: {calories:.0f} ккал ({params})."
+        results.append(InlineQueryResultArticle(
+            id=f"calc_{option}",
+            title=f"{calories:.0f} ккал на день {GOAL_PURPOSES[option]}",
+            description=params,
+            input_message_content=InputTextMessageContent(text),
+        ).to_python())
+    return json.dumps(results, ensure_ascii=False)
+
+@dp.inline_handler()
+async def inline_query(inline_query: types.InlineQuery):
+    # Рядок з параметрами — калькулятор, решта — пошук продуктів
+    params = parse_calc_query(inline_query.query)
+    if params is not None:
+        return AnswerInlineQuery(inline_query.id, calc_results(*params), cache_time=INLINE_CACHE_TIME)
+    if inline_query.query[:1].isdigit():
+        # Схоже на розрахунок, але параметрів бракує: підказка замість порожнього пошуку
+        return AnswerInlineQuery(inline_query.id, [], cache_time=INLINE_CACHE_TIME,
+                                 switch_pm_text=CALC_HINT, switch_pm_parameter='calc')
+    return AnswerInlineQuery(inline_query.id, food_results(inline_query.query), cache_time=3600)
+
+@router.route('diary')
+async def show_diary(callback: types.CallbackQuery, state: FSMContext, payload: str):
+    day, week = await diary.totals(callback.from_user.id)
+    target = await diary.target(callback.from_user.id)
+    return SendMessage(callback.message.chat.id, f"{diary_summary(day, week, target)}\n\n{DIARY_USAGE}")
+
+# Користувач заблокував або розблокував бота
+@dp.my_chat_member_handler()
+async def bot_membership_changed(update: ChatMemberUpdated):
+    if update.chat.type != 'private':
+        return
+    if update.new_chat_member.status == 'kicked':
+        await broadcaster.forget_chat(update.chat.id)
+    elif update.new_chat_member.status == 'member':
+        await broadcaster.remember_chat(update.chat.id)
+
+# Розсилка для адміністраторів: /broadcast [image:назва] [kb:назва] текст
+BROADCAST_USAGE = ("Розсилка всім користувачам: /broadcast [image:назва] [kb:назва] текст\n"
+                   f"Зображення: {', '.join(IMAGE_PATHS)}\nКлавіатури: {', '.join(KEYBOARDS)}")
+
+@dp.message_handler(lambda m: m.from_user.id in ADMIN_IDS, commands=['broadcast'], state='*')
+async def cmd_broadcast(message: types.Message):
+    options = {}
+    words = message.get_args().split(' ')
+    while words and words[0].partition(':')[0] in ('image', 'kb'):
+        key, _, value = words.pop(0).partition(':')
+        options[key] = value
+    text = ' '.join(words).strip()
+    if not text:
+        return SendMessage(message.chat.id, BROADCAST_USAGE)
     try:
-        with open(IMAGE_PATHS['activity'], 'rb') as img:
-            await bot.send_photo(msg.chat.id, img)
-    except FileNotFoundError:
-        pass
-    kb = InlineKeyboardMarkup(row_width=2)
-    kb.add(
-        InlineKeyboardButton("Малорухливий (офісна робота)", callback_data="act_1.2"),
-        InlineKeyboardButton("Легка (справи по дому)", callback_data="act_1.375"),
-        InlineKeyboardButton("Помірна (3–5 тренувань/тиждень)", callback_data="act_1.55"),
-        InlineKeyboardButton("Висока (6–7 тренувань/тиждень)", callback_data="act_1.725"),
-        InlineKeyboardButton("Дуже висока (фізична робота + тренування)", callback_data="act_1.9"),
-        InlineKeyboardButton("⬅️ Назад", callback_data="back_activity"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await msg.answer("Оцініть свій рівень активності:", reply_markup=kb)
-
-@dp.callback_query_handler(lambda c: c.data=='back_activity', state=Form.activity)
-async def back_activity(callback: types.CallbackQuery):
-    await callback.answer()
-    await show_weight(callback.message)
-    await Form.weight.set()
-
-@dp.callback_query_handler(lambda c: c.data.startswith('act_'), state=Form.activity)
-async def process_activity(callback: types.CallbackQuery, state: FSMContext):
-    await callback.answer()
-    code = callback.data.split('_')[1]
-    data = await state.get_data()
-    bmr = calculate_bmr(data['weight'], data['height'], data['age'], data['gender'])
-    tdee = bmr * float(code)
-    goal = data['goal']
-    if goal=='loss': calories, purpose = tdee-500, 'для схуднення'
-    elif goal=='maintain': calories, purpose = tdee, 'для підтримки'
-    else: calories, purpose = tdee+500, 'для набору'
+        broadcast_id = await broadcaster.start(text, options.get('image'), options.get('kb'), report_chat=message.chat.id)
+    except ValueError as e:
+        return SendMessage(message.chat.id, f"{e}\n\n{BROADCAST_USAGE}")
+    return SendMessage(message.chat.id, f"📣 Розсилку {broadcast_id} заплановано, звіт буде тут.")
+
+router.register(dp)
+
+# Вебхук: оновлення йдуть через ту саму UpdateQueue, що й у polling
+def start_webhook():
+    from webhook_app import QueuedRequestHandler, create_app
+
+    queue = make_queue()
+
+    async def start_queue(dp: Dispatcher):
+        queue.start()
+
+    async def drain_queue(dp: Dispatcher):
+        await queue.drain(DRAIN_TIMEOUT)
+
+    app = create_app(WEBHOOK_SECRET, queue)
+    webhook = executor.Executor(dp)
+    webhook.on_startup([start_queue, on_startup_webhook])
+    webhook.on_shutdown([drain_queue, on_shutdown])
+    webhook.set_webhook(WEBHOOK_PATH, request_handler=QueuedRequestHandler, web_app=app)
+    webhook.run_app(host=WEBAPP_HOST, port=WEBAPP_PORT)
+
+# Приймач шардованого режиму: сам оновлень не обробляє, лише розподіляє їх між воркерами
+async def run_supervisor():
+    from sharding import Supervisor
+
+    supervisor = Supervisor(bot, SHARDS, [sys.executable, os.path.abspath(__file__)], drain_timeout=DRAIN_TIMEOUT,
+                            offset_store=OffsetStore(os.path.join(DATA_DIR, 'offset')),
+                            max_in_flight=UPDATE_QUEUE_SIZE)
+    await set_commands()
+    if BOT_MODE == 'webhook':
+        await register_webhook()
+        await supervisor.run_webhook(WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT)
+    else:
+        await bot.delete_webhook()
+        await supervisor.run_polling()
+    await (await bot.get_session()).close()
+
+# Воркер шардованого режиму: оновлення свого шарду читає з stdin
+async def run_shard_worker():
+    from sharding import run_worker
+
+    # Ctrl+C отримує вся група процесів; зупинкою воркерів керує приймач
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    await start_services(preload_images, warm_connection)
+    await run_worker(make_queue())
+    await stop_services()
+
+# Long polling: оновлення не пропускаються при перезапуску, а продовжуються зі збереженого offset
+def make_queue():
+    queue = UpdateQueue(dp, UPDATE_CONCURRENCY, UPDATE_QUEUE_SIZE)
+    if METRICS_PORT:
+        metrics.add_collector(queue.collect)
+    return queue
+
+def make_poller(timeout=20):
+    return UpdatePoller(bot, make_queue(), OffsetStore(os.path.join(DATA_DIR, 'offset')), timeout=timeout,
+                        drain_timeout=DRAIN_TIMEOUT)
+
+async def run_polling():
+    poller = make_poller()
+    poller.install_signal_handlers()
+    # getUpdates не працює, поки встановлено вебхук
+    await bot.delete_webhook()
+    await on_startup(dp)
     try:
-        with open(IMAGE_PATHS['result'], 'rb') as img:
-            await bot.send_photo(callback.message.chat.id, img,
-                caption=f"Ваша добова норма {purpose}: {calories:.0f} ккал.")
-    except FileNotFoundError:
-        await callback.message.reply(f"Ваша добова норма {purpose}: {calories:.0f} ккал.")
-    # Кнопки після підрахунку
-    kb = InlineKeyboardMarkup()
-    kb.add(
-        InlineKeyboardButton("🔄 Порахувати ще раз", callback_data="start_calc"),
-        InlineKeyboardButton("🏠 На початок", callback_data="home")
-    )
-    await callback.message.answer("Що бажаєте далі?", reply_markup=kb)
-    await state.finish()
+        await poller.run()
+    finally:
+        await stop_services()
 
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if SHARD_INDEX is not None:
+        asyncio.run(run_shard_worker())
+    elif SHARDS:
+        asyncio.run(run_supervisor())
+    elif BOT_MODE == 'webhook':
+        start_webhook()
+    else:
+        asyncio.run(run_polling())
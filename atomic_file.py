@@ -0,0 +1,20 @@
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    # Запис «усе або нічого»: дані пишуться в тимчасовий файл поруч і
+    # підміняють path одним os.replace, тож читач ніколи не побачить
+    # половину файлу. Тимчасовий файл свій у кожного процесу: воркери
+    # можуть зберігати той самий файл одночасно.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,67 @@
+# Порівняння пакетного розрахунку (calorie_batch.py) зі скалярним циклом
+# по calculate_bmr / goal_calories з calorie_core. Спершу перевіряє, що результати
+# збігаються до біта, потім міряє час.
+#
+#   python bench/batch_vs_loop.py --rows 1000000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from calorie_batch import calculate_batch  # noqa: E402
+from calorie_core import ACTIVITY_CODES, GOALS, calculate_bmr, goal_calories  # noqa: E402
+
+
+def make_cohort(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'weight': np.round(rng.uniform(40, 160, rows), 1),
+        'height': np.round(rng.uniform(140, 210, rows), 1),
+        'age': rng.integers(14, 90, rows),
+        'gender': rng.choice(['male', 'female'], rows),
+        'activity': rng.choice(ACTIVITY_CODES, rows),
+        'goal': rng.choice(GOALS, rows),
+    }
+
+
+def scalar_loop(cohort):
+    rows = zip(*(cohort[name].tolist() for name in ('weight', 'height', 'age', 'gender', 'activity', 'goal')))
+    out = []
+    for weight, height, age, gender, code, goal in rows:
+        bmr = calculate_bmr(weight, height, age, gender)
+        tdee = bmr * float(code)
+        out.append((bmr, tdee, goal_calories(tdee, goal)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    cohort = make_cohort(args.rows)
+
+    started = time.perf_counter()
+    expected = scalar_loop(cohort)
+    loop_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = calculate_batch(**cohort)
+    batch_time = time.perf_counter() - started
+
+    expected = np.array(expected)
+    for i, name in enumerate(result._fields):
+        if not np.array_equal(expected[:, i], getattr(result, name)):
+            raise SystemExit(f'{name} differs from the scalar path')
+
+    print(f'rows:   {args.rows}')
+    print(f'loop:   {loop_time:.3f} s')
+    print(f'batch:  {batch_time:.3f} s ({loop_time / batch_time:.0f}x faster), results identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Бенчмарки calorie_core (pytest-benchmark). Працюють офлайн: ні токена, ні
+# мережі, ні aiogram не потрібно. Кожен бенчмарк заодно перевіряє результат.
+#
+#   pip install pytest-benchmark
+#   python -m pytest bench/bench_core.py --benchmark-sort=mean
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import calorie_core  # noqa: E402
+from calorie_core import (STEPS, Profile, calculate_bmr, daily_calories, next_step, parse_answer,  # noqa: E402
+                          parse_calc_query, parse_profile_value)
+
+PROFILE = Profile('loss', 'male', 30, 180.0, 80.0, '1.55')
+# Відповіді на кроки анкети так, як їх надсилає користувач: кнопки й текст
+ANSWERS = {'goal': 'loss', 'gender': 'male', 'age': '30', 'height': '180', 'weight': '80', 'activity': '1.55'}
+
+
+def test_calculate_bmr(benchmark):
+    assert benchmark(calculate_bmr, 80.0, 180.0, 30, 'male') == pytest.approx(1781.6)
+
+
+def test_daily_calories(benchmark):
+    assert benchmark(daily_calories, PROFILE) == pytest.approx(1781.6 * 1.55 - 500)
+
+
+def test_questionnaire(benchmark):
+    # Уся анкета від першого кроку до норми, як її проходить бот
+    def walk():
+        data = {}
+        step = STEPS[0].name
+        while step is not None:
+            choices = calorie_core.STEP_BY_NAME[step].choices
+            answer = ANSWERS[step]
+            data[step] = answer if choices else parse_answer(step, answer)
+            step = next_step(step)
+        return daily_calories(Profile(**data))
+
+    assert benchmark(walk) == pytest.approx(daily_calories(PROFILE))
+
+
+def test_parse_calc_query(benchmark):
+    assert benchmark(parse_calc_query, '80 180 30 m 1.55 loss') == (80.0, 180.0, 30, 'male', '1.55', 'loss')
+
+
+def test_parse_profile_value(benchmark):
+    assert benchmark(parse_profile_value, 'вага 78,5') == ('weight', 78.5)
+
+
+def test_batch_of_profiles(benchmark):
+    # Пакетна задача без NumPy: 10 000 профілів звичайним циклом
+    profiles = [PROFILE._replace(weight=50 + i % 70, age=18 + i % 60) for i in range(10_000)]
+    totals = benchmark(lambda: [daily_calories(profile) for profile in profiles])
+    assert len(totals) == len(profiles)
+
+
+def test_import(benchmark):
+    # Повторний імпорт пакета з уже прочитаних з диска файлів
+    def reload_core():
+        for name in [name for name in sys.modules if name.split('.')[0] == 'calorie_core']:
+            del sys.modules[name]
+        return importlib.import_module('calorie_core')
+
+    benchmark(reload_core)
+
+
+def test_cold_import_without_aiogram():
+    # Новий інтерпретатор: пакет не тягне aiogram і не вимагає TELEGRAM_TOKEN
+    env = {key: value for key, value in os.environ.items() if key != 'TELEGRAM_TOKEN'}
+    code = 'import sys, calorie_core; print(sorted(m for m in ("aiogram", "aiohttp") if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,81 @@
+# Розсилка проти локальної заміни Bot API: пропускна здатність, відновлення
+# після переривання і відсіювання тих, хто заблокував бота.
+# Розсилку обривають посередині (як падіння чи перевикладку), потім новий
+# Broadcaster продовжує її з того ж файлу; в кінці перевіряємо, що жоден
+# чат не отримав повідомлення двічі.
+#
+#   python bench/broadcast_resume.py --chats 3000 --send-rate 30 --latency 0.05
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fake_api import FakeBotAPI
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    data_dir = tempfile.mkdtemp(prefix='calorie-bot-broadcast-')
+    os.environ['TELEGRAM_TOKEN'] = '123456:BROADCAST'
+    os.environ['TELEGRAM_API_SERVER'] = api.base_url
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['SEND_RATE'] = str(args.send_rate)
+    os.environ['METRICS_PORT'] = '0'
+    sys.path.insert(0, ROOT_DIR)
+    import BOT
+    from broadcast import Broadcaster
+
+    chats = [100_000 + i for i in range(args.chats)]
+    api.blocked = set(random.Random(1).sample(chats, int(args.chats * args.blocked)))
+    for chat_id in chats:
+        await BOT.broadcaster.remember_chat(chat_id)
+
+    started = time.perf_counter()
+    broadcast_id = await BOT.broadcaster.start("Порада дня: пийте воду 💧", image='result', keyboard='start')
+    # «Падіння» посеред розсилки
+    await asyncio.sleep(args.interrupt)
+    await BOT.broadcaster.close()
+    first = BOT.broadcaster.progress[broadcast_id]
+    print(f'interrupted after {args.interrupt:.0f} s: {first}')
+
+    # Новий процес: той самий файл, розсилка продовжується сама
+    resumed = Broadcaster(BOT.broadcaster.path, BOT.bot, BOT.images, BOT.KEYBOARDS, report_interval=args.report)
+    resumed.start_watching()
+    while broadcast_id not in resumed.progress or resumed._tasks:
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    second = resumed.progress[broadcast_id]
+    await resumed.close()
+
+    delivered = {chat: n for chat, n in api.calls_by_chat.items() if chat not in api.blocked}
+    duplicates = sum(1 for n in delivered.values() if n > 1)
+    reachable = args.chats - len(api.blocked)
+    print(f'resumed:      {second}')
+    print(f'delivered:    {len(delivered)} of {reachable} reachable chats, duplicates: {duplicates}')
+    print(f'pruned:       {first.blocked + second.blocked} of {len(api.blocked)} blocked chats')
+    print(f'throughput:   {(first.done + second.done) / elapsed:.1f} msg/s over {elapsed:.1f} s')
+    print('API calls:    ' + ', '.join(f'{m}={n}' for m, n in api.calls.most_common()))
+
+    await BOT.dp.storage.close()
+    await BOT.dp.storage.wait_closed()
+    await (await BOT.bot.get_session()).close()
+    await api.stop()
+    return duplicates == 0 and len(delivered) == reachable
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resumable broadcast against a fake Bot API')
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--blocked', type=float, default=0.05, help='share of chats that blocked the bot')
+    parser.add_argument('--send-rate', type=float, default=30.0, help="bot's global send limit, msg/s")
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Bot API latency per call, seconds')
+    parser.add_argument('--interrupt', type=float, default=10.0, help='stop the first run after this many seconds')
+    parser.add_argument('--report', type=float, default=5.0, help='progress report interval, seconds')
+    ok = asyncio.run(main(parser.parse_args()))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,70 @@
+# Вартість маршрутизації callback_query: ланцюжок lambda-фільтрів aiogram
+# проти CallbackRouter, залежно від кількості зареєстрованих кнопок.
+# Обробники порожні, тож міряється лише пошук обробника.
+#
+#   python bench/callback_routing.py
+import asyncio
+import os
+import sys
+import time
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from callback_router import CallbackRouter  # noqa: E402
+
+STATE = 'Flow:step'
+
+
+async def noop(*args):
+    return None
+
+
+def linear_dispatcher(routes):
+    dp = Dispatcher(Bot('123456:BENCH'), storage=MemoryStorage())
+    for i in range(routes):
+        dp.register_callback_query_handler(noop, lambda c, d=f'btn{i}_x': c.data == d, state=STATE)
+    return dp
+
+
+def routed_dispatcher(routes):
+    dp = Dispatcher(Bot('123456:BENCH'), storage=MemoryStorage())
+    router = CallbackRouter()
+    for i in range(routes):
+        router.route(f'btn{i}', state=STATE)(noop)
+    router.register(dp)
+    return dp
+
+
+def callback_update(data):
+    return types.Update(**{
+        'update_id': 1,
+        'callback_query': {
+            'id': '1', 'chat_instance': '1', 'data': data,
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'bench'},
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': 'private'}},
+        },
+    })
+
+
+async def measure(dp, routes, number):
+    await dp.storage.set_state(chat=42, user=42, state=STATE)
+    # Остання зареєстрована кнопка — найгірший випадок для лінійного ланцюжка
+    update = callback_update(f'btn{routes - 1}_x')
+    started = time.perf_counter()
+    for _ in range(number):
+        await dp.process_update(update)
+    return (time.perf_counter() - started) / number
+
+
+async def main(number=2000):
+    print(f'{"routes":>6} {"lambda chain":>14} {"router":>10}')
+    for routes in (14, 50, 200, 1000):
+        linear = await measure(linear_dispatcher(routes), routes, number)
+        routed = await measure(routed_dispatcher(routes), routes, number)
+        print(f'{routes:6d} {linear * 1e6:11.1f} µs {routed * 1e6:7.1f} µs')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
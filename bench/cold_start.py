@@ -0,0 +1,86 @@
+# Холодний старт бота, як після масштабування до нуля на fly.io.
+# Для кожного запуску — новий процес `python BOT.py` проти локальної заміни Bot API:
+#   import  — скільки триває `import BOT` в окремому інтерпретаторі (разом із самим інтерпретатором);
+#   ready   — від запуску процесу до першого getUpdates, тобто до готовності приймати оновлення;
+#   first   — від запуску процесу до відповіді на перший /start.
+# Перший запуск іде з порожнім DATA_DIR (як перша перевикладка), решта — з тим самим,
+# тож видно і вартість setMyCommands, і його пропуск, коли команди не змінилися.
+#
+#   python bench/cold_start.py --runs 10 --latency 0.05
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from fake_api import FakeBotAPI
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def time_import(env):
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, '-c', 'import BOT', cwd=ROOT_DIR, env=env)
+    await process.wait()
+    return time.perf_counter() - started
+
+
+async def cold_start(api, env, timeout):
+    api._polled.clear()
+    calls_before = sum(api.calls.values())
+    commands_before = api.calls['setMyCommands']
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT_DIR, 'BOT.py'),
+                                                   cwd=ROOT_DIR, env=env)
+    try:
+        await asyncio.wait_for(api.wait_for_poll(), timeout)
+        ready = time.perf_counter() - started
+        chat_id = 500_000
+        replies = api.subscribe(chat_id)
+        api.push(api.message_update(chat_id, '/start'))
+        await asyncio.wait_for(replies.get(), timeout)
+        first = time.perf_counter() - started
+        api.subscribers.pop(chat_id, None)
+    finally:
+        process.terminate()
+        await process.wait()
+    # Оновлення, які бот так і не забрав, не мають дістатися наступному запуску
+    api.updates.clear()
+    return ready, first, sum(api.calls.values()) - calls_before, api.calls['setMyCommands'] - commands_before
+
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    env = dict(os.environ,
+               TELEGRAM_TOKEN='123456:COLDSTART',
+               TELEGRAM_API_SERVER=api.base_url,
+               BOT_MODE='polling',
+               DATA_DIR=tempfile.mkdtemp(prefix='calorie-bot-cold-'),
+               LOG_LEVEL='WARNING')
+    env.pop('METRICS_PORT', None)
+    env.pop('SHARDS', None)
+
+    imports = [await time_import(env) for _ in range(args.runs)]
+    print(f'{"run":>4} {"ready ms":>9} {"first reply ms":>15} {"API calls":>10} {"setMyCommands":>14}')
+    readies, firsts = [], []
+    for run in range(args.runs):
+        ready, first, calls, commands = await cold_start(api, env, args.timeout)
+        readies.append(ready)
+        firsts.append(first)
+        print(f'{run + 1:>4} {ready * 1000:>9.0f} {first * 1000:>15.0f} {calls:>10} {commands:>14}')
+    await api.stop()
+
+    print(f'\nimport BOT (median of {args.runs}):  {statistics.median(imports) * 1000:.0f} ms')
+    print(f'time to ready (median):       {statistics.median(readies) * 1000:.0f} ms')
+    print(f'time to first reply (median): {statistics.median(firsts) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold start: import time, time to ready and to the first reply')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Bot API latency per call, seconds')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict, deque
+
+from aiohttp import web
+
+# Локальна заміна Telegram Bot API для навантажувальних тестів.
+# Відповідає на виклики бота правдоподібними об'єктами, віддає синтетичні
+# оновлення через getUpdates або POST на вебхук і повідомляє драйвер про
+# кожне повідомлення, яке бот надіслав чи відредагував.
+
+# id збігається з числом у токені, яким бенчмарки запускають бота (123456:...)
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'CalorieBot', 'username': 'calorie_bot'}
+
+
+class FakeBotAPI:
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        # Ще не підтверджені оновлення: як і Telegram, віддаємо їх, доки getUpdates
+        # не прийде з offset, більшим за їхній update_id
+        self.updates = deque()
+        self._arrived = asyncio.Event()
+        self.calls = Counter()
+        self.calls_by_chat = Counter()
+        # Чати, які «заблокували» бота: надсилання в них отримує 403
+        self.blocked = set()
+        self.subscribers = defaultdict(list)
+        self._message_ids = itertools.count(1000)
+        self._update_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner = None
+        self._polled = asyncio.Event()
+        self.app = web.Application(client_max_size=20 * 1024 ** 2)
+        self.app.router.add_post('/bot{token}/{method}', self.handle)
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- синтетичні оновлення ---
+
+    def _user(self, chat_id):
+        return {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}', 'language_code': 'uk'}
+
+    def message_update(self, chat_id, text):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': self._user(chat_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+
+    def callback_update(self, chat_id, data, message_id):
+        return {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self._user(chat_id),
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': BOT_USER,
+                },
+            },
+        }
+
+    def inline_update(self, user_id, query):
+        return {
+            'update_id': next(self._update_ids),
+            'inline_query': {'id': str(next(self._update_ids)), 'from': self._user(user_id),
+                             'query': query, 'offset': ''},
+        }
+
+    def push(self, update):
+        self.updates.append(update)
+        self._arrived.set()
+
+    def subscribe(self, chat_id):
+        # Черга подій (method, payload, message) для одного чату
+        queue = asyncio.Queue()
+        self.subscribers[chat_id].append(queue)
+        return queue
+
+    def _notify(self, chat_id, method, payload, message):
+        for queue in self.subscribers.get(chat_id, ()):
+            queue.put_nowait((method, payload, message))
+
+    # --- Bot API ---
+
+    async def wait_for_poll(self):
+        # Бот готовий, коли вперше прийшов по оновлення
+        await self._polled.wait()
+
+    async def _get_updates(self, payload):
+        self._polled.set()
+        offset = int(payload.get('offset') or 0)
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+        if not self.updates:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), float(payload.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                return []
+        return list(itertools.islice(self.updates, int(payload.get('limit') or 100)))
+
+    def _message(self, payload, **extra):
+        chat_id = int(payload['chat_id'])
+        message = {
+            'message_id': int(payload.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(extra)
+        if payload.get('reply_markup'):
+            message['reply_markup'] = json.loads(payload['reply_markup'])
+        return message
+
+    def _photo(self, payload, field='photo'):
+        value = payload.get(field)
+        file_id = value if isinstance(value, str) and not value.startswith('attach://') else f'fake-file-{next(self._file_ids)}'
+        return [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        payload = dict(await request.post())
+        if method != 'getUpdates':
+            self.calls[method] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+        chat_id = payload.get('chat_id')
+        if chat_id is not None and int(chat_id) in self.blocked:
+            return web.json_response({'ok': False, 'error_code': 403,
+                                      'description': 'Forbidden: bot was blocked by the user'}, status=403)
+
+        result = True
+        if method == 'getUpdates':
+            result = await self._get_updates(payload)
+        elif method == 'getMe':
+            result = BOT_USER
+        elif method == 'getWebhookInfo':
+            result = {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        elif method == 'sendMessage':
+            result = self._message(payload, text=payload.get('text', ''))
+        elif method == 'sendPhoto':
+            result = self._message(payload, photo=self._photo(payload), caption=payload.get('caption'))
+        elif method in ('editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageMedia'):
+            extra = {}
+            if method == 'editMessageMedia':
+                media = json.loads(payload['media'])
+                extra = {'photo': self._photo(media, 'media'), 'caption': media.get('caption')}
+            elif method == 'editMessageCaption':
+                extra = {'caption': payload.get('caption')}
+            elif method == 'editMessageText':
+                extra = {'text': payload.get('text')}
+            result = self._message(payload, **extra)
+
+        if chat_id is not None and method != 'getUpdates':
+            self.calls_by_chat[int(chat_id)] += 1
+            self._notify(int(chat_id), method, payload, result)
+        return web.json_response({'ok': True, 'result': result})
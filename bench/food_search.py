@@ -0,0 +1,93 @@
+# Швидкість пошуку продуктів: індекс food_index.py проти лінійного проходу по таблиці.
+# Крім вбудованої таблиці, будує синтетичну на --rows рядків (назви з
+# вбудованої з числовими суфіксами), щоб показати, як пошук масштабується.
+#
+#   python bench/food_search.py --rows 100000
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from food_index import FoodIndex, build_index, normalize, trigrams  # noqa: E402
+
+FOODS_CSV = os.path.join(ROOT_DIR, 'foods', 'foods.csv')
+QUERIES = ['греч', 'молоко', 'масло в', 'chicken', 'к', 'гречкаа', 'chiken', 'молако', 'tomatto']
+
+
+def synthetic_csv(path, rows):
+    with open(FOODS_CSV, newline='', encoding='utf-8') as f:
+        base = list(csv.DictReader(f))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(base[0]))
+        writer.writeheader()
+        for i in range(rows):
+            row = dict(base[i % len(base)])
+            if i >= len(base):
+                row['name_uk'] += f' {i}'
+                row['name_en'] += f' {i}'
+            writer.writerow(row)
+
+
+def linear_search(rows, query, limit=10):
+    # Те, що довелося б робити без індексу: нормалізувати й порівняти кожен рядок
+    query = normalize(query)
+    grams = trigrams(query)
+    prefix, fuzzy = [], []
+    for row in rows:
+        names = [normalize(row['name_uk']), normalize(row['name_en'])]
+        if any(word.startswith(query) for name in names for word in [name] + name.split()):
+            prefix.append(row)
+        elif len(grams & (trigrams(names[0]) | trigrams(names[1]))) >= len(grams) / 2:
+            fuzzy.append(row)
+    return (prefix + fuzzy)[:limit]
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench(csv_path, index_path, label, repeat):
+    started = time.perf_counter()
+    build_index(csv_path, index_path)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    index = FoodIndex(index_path)
+    opened = time.perf_counter() - started
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    print(f'\n{label}: {len(index)} foods, index {os.path.getsize(index_path) / 1024:.0f} KB, '
+          f'built in {built * 1000:.0f} ms, opened in {opened * 1e6:.0f} µs')
+    print(f'{"query":<12} {"index µs":>10} {"linear µs":>11}  top match')
+    for query in QUERIES:
+        indexed = timed(lambda: index.search(query), repeat)
+        linear = timed(lambda: linear_search(rows, query), max(1, repeat // 100))
+        top = index.search(query, 1)
+        print(f'{query:<12} {indexed * 1e6:>10.1f} {linear * 1e6:>11.0f}  {top[0].name_uk if top else "-"}')
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Food search: mmap index vs linear scan')
+    parser.add_argument('--rows', type=int, default=100_000, help='size of the synthetic table')
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Індекси — лише у тимчасовому каталозі: у foods/ лежить тільки таблиця
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(FOODS_CSV, os.path.join(tmp, 'bundled.idx'), 'bundled table', args.repeat)
+        path = os.path.join(tmp, 'foods.csv')
+        synthetic_csv(path, args.rows)
+        bench(path, os.path.join(tmp, 'synthetic.idx'), 'synthetic table', args.repeat)
+
+
+if __name__ == '__main__':
+    main()
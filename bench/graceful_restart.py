@@ -0,0 +1,124 @@
+# Перевикладка під навантаженням: бот (`python BOT.py`, polling) отримує потік
+# повідомлень від багатьох чатів, посередині отримує SIGTERM, доробляє прийняте
+# і виходить, після чого стартує новий процес з тим самим DATA_DIR.
+# Кожне повідомлення — «/eat продуктN 100», відповідь на нього містить N, тож
+# в кінці перевіряємо: жодне не загубилося, жодне не оброблено двічі і в
+# кожному чаті відповіді йдуть у порядку повідомлень. Якщо DRAIN_TIMEOUT
+# перервав обробку, ці оновлення (не більше UPDATE_CONCURRENCY) обробляються вдруге.
+# Локальна заміна Bot API, як і Telegram, віддає оновлення, доки їх не підтвердить offset.
+#
+#   python bench/graceful_restart.py --chats 200 --messages 10 --restart-after 3
+import argparse
+import asyncio
+import os
+import re
+import signal
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from fake_api import FakeBotAPI
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPLY = re.compile(r'продукт(\d+)')
+
+
+async def start_bot(api, env):
+    api._polled.clear()
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT_DIR, 'BOT.py'),
+                                                   cwd=ROOT_DIR, env=env)
+    await api.wait_for_poll()
+    return process, time.perf_counter() - started
+
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    env = dict(os.environ,
+               TELEGRAM_TOKEN='123456:RESTART',
+               TELEGRAM_API_SERVER=api.base_url,
+               BOT_MODE='polling',
+               DATA_DIR=tempfile.mkdtemp(prefix='calorie-bot-restart-'),
+               SEND_RATE='10000',
+               CHAT_SEND_RATE='1000',
+               METRICS_PORT='0',
+               LOG_LEVEL='WARNING',
+               UPDATE_CONCURRENCY=str(args.concurrency),
+               UPDATE_QUEUE_SIZE=str(args.queue_size),
+               DRAIN_TIMEOUT=str(args.drain_timeout))
+    env.pop('SHARDS', None)
+
+    replies = defaultdict(list)
+    chats = [700_000 + i for i in range(args.chats)]
+    original_notify = api._notify
+
+    def notify(chat_id, method, payload, message):
+        match = REPLY.search(payload.get('text') or '')
+        if method == 'sendMessage' and match:
+            replies[chat_id].append(int(match.group(1)))
+        original_notify(chat_id, method, payload, message)
+
+    api._notify = notify
+
+    async def produce():
+        # Повідомлення надходять рівномірно впродовж --duration секунд
+        total = args.chats * args.messages
+        for n in range(args.messages):
+            for chat_id in chats:
+                api.push(api.message_update(chat_id, f'/eat продукт{n} 100'))
+                await asyncio.sleep(args.duration / total)
+
+    process, ready = await start_bot(api, env)
+    producer = asyncio.create_task(produce())
+    await asyncio.sleep(args.restart_after)
+
+    answered_before = sum(map(len, replies.values()))
+    stopping = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    code = await process.wait()
+    drained = time.perf_counter() - stopping
+    answered_during_drain = sum(map(len, replies.values())) - answered_before
+
+    process, ready_again = await start_bot(api, env)
+    await producer
+    deadline = time.monotonic() + args.timeout
+    expected = args.chats * args.messages
+    while sum(map(len, replies.values())) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    await asyncio.sleep(1)
+    process.send_signal(signal.SIGTERM)
+    await process.wait()
+    await api.stop()
+
+    missing = duplicates = out_of_order = 0
+    for chat_id in chats:
+        got = replies[chat_id]
+        missing += len(set(range(args.messages)) - set(got))
+        duplicates += len(got) - len(set(got))
+        out_of_order += sum(1 for a, b in zip(got, got[1:]) if b < a)
+    print(f'messages:      {expected} from {args.chats} chats')
+    print(f'SIGTERM:       exit code {code} after {drained * 1000:.0f} ms, '
+          f'{answered_during_drain} replies sent while draining')
+    print(f'ready:         {ready * 1000:.0f} ms first start, {ready_again * 1000:.0f} ms after restart')
+    print(f'missing:       {missing}')
+    print(f'duplicates:    {duplicates}')
+    print(f'out of order:  {out_of_order}')
+    # Повторитися можуть лише оновлення, обробку яких перервав DRAIN_TIMEOUT: їх не більше, ніж обробників
+    return not (missing or out_of_order) and duplicates <= args.concurrency
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SIGTERM under load: drain, saved offset, per-chat order')
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=10, help='messages per chat')
+    parser.add_argument('--duration', type=float, default=6.0, help='spread the messages over this many seconds')
+    parser.add_argument('--restart-after', type=float, default=3.0, help='send SIGTERM after this many seconds')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Bot API latency per call, seconds')
+    parser.add_argument('--concurrency', type=int, default=32, help='UPDATE_CONCURRENCY of the bot')
+    parser.add_argument('--queue-size', type=int, default=1000, help='UPDATE_QUEUE_SIZE of the bot')
+    parser.add_argument('--drain-timeout', type=float, default=25.0, help='DRAIN_TIMEOUT of the bot')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    ok = asyncio.run(main(parser.parse_args()))
+    sys.exit(0 if ok else 1)
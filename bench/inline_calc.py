@@ -0,0 +1,75 @@
+# Інлайн-калькулятор: скільки коштує відповідь на запит «@бот 80 180 30 m 1.55 loss»
+# без кешу і з кешем calc_results. Потік запитів — як від реальних користувачів:
+# більшість вводить «круглі» параметри, тож популярні комбінації повторюються
+# (розподіл Зіпфа над --distinct різними запитами).
+# Окремо показано, яка частка запитів узагалі дійшла б до бота: однаковий
+# рядок запиту Telegram упродовж cache_time віддає зі свого кешу.
+#
+#   python bench/inline_calc.py --queries 50000 --distinct 2000
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:INLINE')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='calorie-bot-inline-'))
+os.environ['METRICS_PORT'] = '0'
+
+import BOT  # noqa: E402
+from aiogram import types  # noqa: E402
+
+USER = {'id': 42, 'is_bot': False, 'first_name': 'Bench'}
+
+
+def make_queries(count, distinct, seed):
+    rng = random.Random(seed)
+    pool = []
+    while len(pool) < distinct:
+        query = (f"{rng.randrange(50, 120)} {rng.randrange(150, 200)} {rng.randrange(18, 70)} "
+                 f"{rng.choice('mf')} {rng.choice(BOT.ACTIVITY_CODES)} {rng.choice(('loss', 'maintain', 'gain'))}")
+        if query not in pool:
+            pool.append(query)
+    weights = [1 / rank for rank in range(1, distinct + 1)]
+    return rng.choices(pool, weights, k=count)
+
+
+async def answer_all(queries):
+    # Обробник плюс підготовка запиту до Bot API, як у UpdateQueue
+    started = time.perf_counter()
+    for i, query in enumerate(queries):
+        inline_query = types.InlineQuery(id=str(i), query=query, offset='', **{'from': USER})
+        response = await BOT.inline_query(inline_query)
+        response.cleanup()
+    return (time.perf_counter() - started) / len(queries)
+
+
+async def main(args):
+    queries = make_queries(args.queries, args.distinct, args.seed)
+
+    cached = BOT.calc_results
+    BOT.calc_results = cached.__wrapped__
+    uncached_time = await answer_all(queries)
+    BOT.calc_results = cached
+    cached.cache_clear()
+    cached_time = await answer_all(queries)
+    info = cached.cache_info()
+
+    print(f'queries:              {len(queries)} ({args.distinct} distinct)')
+    print(f'without cache:        {uncached_time * 1e6:.1f} us per query')
+    print(f'with calc_results:    {cached_time * 1e6:.1f} us per query '
+          f'({info.hits / (info.hits + info.misses):.0%} hits, {info.currsize} cached)')
+    print(f'reach the bot:        {len(set(queries)) / len(queries):.0%} of queries '
+          f'with cache_time={BOT.INLINE_CACHE_TIME} s on the Telegram side')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inline calculator: uncached vs memoized answers')
+    parser.add_argument('--queries', type=int, default=50_000)
+    parser.add_argument('--distinct', type=int, default=2000, help='different query strings in the stream')
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
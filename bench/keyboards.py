@@ -0,0 +1,54 @@
+# Мікробенчмарк реєстру клавіатур: скільки коштує підготувати reply_markup
+# для одного кроку анкети, якщо будувати клавіатуру щоразу (як раніше),
+# і якщо брати готовий JSON з keyboards.KEYBOARDS.
+#
+#   python bench/keyboards.py
+import os
+import sys
+import timeit
+import tracemalloc
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.payload import prepare_arg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from keyboards import KEYBOARDS  # noqa: E402
+
+
+def build_activity():
+    # Так клавіатуру кроку «активність» будував show_activity до реєстру
+    kb = InlineKeyboardMarkup(row_width=2)
+    kb.add(
+        InlineKeyboardButton("Малорухливий (офісна робота)", callback_data="act_1.2"),
+        InlineKeyboardButton("Легка (справи по дому)", callback_data="act_1.375"),
+        InlineKeyboardButton("Помірна (3–5 тренувань/тиждень)", callback_data="act_1.55"),
+        InlineKeyboardButton("Висока (6–7 тренувань/тиждень)", callback_data="act_1.725"),
+        InlineKeyboardButton("Дуже висока (фізична робота + тренування)", callback_data="act_1.9"),
+        InlineKeyboardButton("⬅️ Назад", callback_data="back_activity"),
+        InlineKeyboardButton("🏠 На початок", callback_data="home")
+    )
+    return prepare_arg(kb)
+
+
+def from_registry():
+    return prepare_arg(KEYBOARDS['activity'])
+
+
+def peak_bytes(func):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return peak
+
+
+def main(number=20_000):
+    for name, func in (('build per step', build_activity), ('registry', from_registry)):
+        seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f'{name:15} {seconds * 1e6:8.2f} µs/step  {peak_bytes(func):7d} B peak alloc/step')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Навантажувальний тест анкети Form без доступу до Telegram.
+# Піднімає локальну заміну Bot API (fake_api.py), запускає BOT.py в режимі
+# polling і проводить N синтетичних користувачів від /start до результату.
+#
+#   python bench/load_funnel.py --users 500 --latency 0.02
+import argparse
+import asyncio
+import glob
+import os
+import resource
+import signal
+import statistics
+import sys
+import tempfile
+import time
+
+from fake_api import FakeBotAPI
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Кроки воронки: тип оновлення і текст повідомлення або callback_data
+FUNNEL = [
+    ('message', '/start'),
+    ('callback', 'start_calc'),
+    ('callback', 'goal_loss'),
+    ('callback', 'gender_male'),
+    ('message', '30'),
+    ('message', '180'),
+    ('message', '80'),
+    ('callback', 'act_1.55'),
+]
+
+# Повторний розрахунок зі збереженого профілю (--recalc): екран профілю і зміна одного поля
+RECALC = [
+    ('callback', 'recalc'),
+    ('message', 'вага 78'),
+    ('callback', 'edit_activity:1.375'),
+]
+
+
+async def wait_prompt(events, timeout):
+    # Крок завершено, коли бот показав наступну клавіатуру
+    while True:
+        method, payload, message = await asyncio.wait_for(events.get(), timeout)
+        if payload.get('reply_markup'):
+            return message['message_id']
+
+
+async def run_user(api, chat_id, latencies, timeout, steps=FUNNEL, message_id=None):
+    # Повертає id повідомлення-майстра після останнього кроку або None, якщо бот не відповів
+    events = api.subscribe(chat_id)
+    for kind, value in steps:
+        if kind == 'message':
+            update = api.message_update(chat_id, value)
+        else:
+            update = api.callback_update(chat_id, value, message_id)
+        started = time.perf_counter()
+        api.push(update)
+        try:
+            message_id = await wait_prompt(events, timeout)
+        except asyncio.TimeoutError:
+            return None
+        latencies.append(time.perf_counter() - started)
+    api.subscribers.pop(chat_id, None)
+    return message_id
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+async def main(args):
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+
+    os.environ['TELEGRAM_TOKEN'] = '123456:LOADTEST'
+    os.environ['TELEGRAM_API_SERVER'] = api.base_url
+    os.environ['BOT_MODE'] = 'polling'
+    os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='calorie-bot-load-')
+    os.environ['SEND_RATE'] = str(args.send_rate)
+    os.environ['CHAT_SEND_RATE'] = str(args.chat_rate)
+    if args.storage:
+        os.environ['FSM_STORAGE'] = args.storage
+    if args.trace_slow_ms:
+        os.environ['TRACE_SLOW_MS'] = str(args.trace_slow_ms)
+
+    if args.shards:
+        # Шардований режим: окремий процес-приймач і воркери, як у продакшені
+        os.environ['SHARDS'] = str(args.shards)
+        os.environ['METRICS_PORT'] = '0'
+        bot_process = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT_DIR, 'BOT.py'))
+        await api.wait_for_poll()
+        # Даємо воркерам імпортувати BOT.py до першого користувача
+        await asyncio.sleep(args.warmup)
+    else:
+        sys.path.insert(0, ROOT_DIR)
+        import BOT
+
+        await BOT.on_startup(BOT.dp)
+        # Той самий шлях, що й у `python BOT.py`: UpdatePoller з UpdateQueue
+        poller = BOT.make_poller(timeout=1)
+        polling = asyncio.create_task(poller.run())
+        await asyncio.sleep(0.2)
+    calls_before = sum(api.calls.values())
+
+    if args.shards and args.rolling_restart:
+        # Перезапуск воркерів посеред навантаження: жоден користувач не має загубитися
+        asyncio.get_running_loop().call_later(args.rolling_restart, bot_process.send_signal, signal.SIGHUP)
+
+    latencies = []
+    started = time.perf_counter()
+    users = []
+    for i in range(args.users):
+        users.append(asyncio.create_task(run_user(api, 10_000 + i, latencies, args.timeout)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.users)
+    wizards = await asyncio.gather(*users)
+    completed = sum(1 for message_id in wizards if message_id is not None)
+    elapsed = time.perf_counter() - started
+    api_calls = sum(api.calls.values()) - calls_before
+
+    if args.recalc:
+        # Ті самі користувачі перераховують норму: без анкети, одним полем
+        calls_before = sum(api.calls.values())
+        recalc_latencies = []
+        recalculated = await asyncio.gather(*(
+            run_user(api, 10_000 + i, recalc_latencies, args.timeout, RECALC, message_id)
+            for i, message_id in enumerate(wizards) if message_id is not None))
+        recalc_calls = sum(api.calls.values()) - calls_before
+        recalc_done = sum(1 for message_id in recalculated if message_id is not None)
+
+    if args.shards:
+        bot_process.terminate()
+        await bot_process.wait()
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    else:
+        poller.stop()
+        await polling
+        await BOT.dp.storage.close()
+        await BOT.dp.storage.wait_closed()
+        await (await BOT.bot.get_session()).close()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+    await api.stop()
+
+    peak_rss = usage.ru_maxrss / 1024
+    print(f'users:                 {args.users} (completed {completed})')
+    print(f'updates/sec:           {len(latencies) / elapsed:.1f}')
+    print(f'step latency p50/p95/p99: '
+          f'{percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 95) * 1000:.1f} / '
+          f'{percentile(latencies, 99) * 1000:.1f} ms')
+    print(f'API calls per calc:    {api_calls / max(completed, 1):.1f}')
+    # У шардованому режимі — найбільший із процесів бота
+    print(f'peak RSS:              {peak_rss:.1f} MB')
+    if args.recalc:
+        print(f'recalcs:               {recalc_done} of {completed}, '
+              f'{recalc_calls / max(recalc_done, 1):.1f} API calls for the profile screen '
+              f'and {len(RECALC) - 1} field changes, step p50 {percentile(recalc_latencies, 50) * 1000:.1f} ms')
+    print('calls by method:       ' + ', '.join(f'{m}={n}' for m, n in api.calls.most_common()))
+    if args.trace_slow_ms:
+        traces = glob.glob(os.path.join(os.environ['DATA_DIR'], 'slow_updates.jsonl*'))
+        slow = sum(1 for path in traces for _ in open(path, encoding='utf-8'))
+        print(f'slow updates traced:   {slow} in {", ".join(traces) or "-"}')
+    return completed == args.users
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the Form funnel against a fake Bot API')
+    parser.add_argument('--users', type=int, default=200, help='number of concurrent synthetic users')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake Bot API latency per call, seconds')
+    parser.add_argument('--ramp', type=float, default=0.0, help='spread user starts over this many seconds')
+    parser.add_argument('--timeout', type=float, default=30.0, help='max wait for a single step, seconds')
+    parser.add_argument('--send-rate', type=float, default=30.0,
+                        help="bot's global send limit, msg/s (raise it to measure handler cost alone)")
+    parser.add_argument('--chat-rate', type=float, default=1.0, help="bot's per-chat send limit, msg/s")
+    parser.add_argument('--storage', choices=['sqlite', 'bounded', 'memory'], help='FSM storage to use')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='run BOT.py as a supervisor with this many worker processes (0: in-process polling)')
+    parser.add_argument('--warmup', type=float, default=2.0, help='time for shard workers to start, seconds')
+    parser.add_argument('--recalc', action='store_true',
+                        help='after the funnel, recalculate from the saved profile and count its API calls')
+    parser.add_argument('--trace-slow-ms', type=float, default=0.0,
+                        help='enable tracing; updates slower than this are written to DATA_DIR/slow_updates.jsonl*')
+    parser.add_argument('--rolling-restart', type=float, default=0.0,
+                        help='send SIGHUP to the supervisor this many seconds into the run')
+    ok = asyncio.run(main(parser.parse_args()))
+    sys.exit(0 if ok else 1)
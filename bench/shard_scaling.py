@@ -0,0 +1,46 @@
+# Масштабування шардованого режиму за кількістю процесів-воркерів.
+# Для кожного значення SHARDS запускає load_funnel.py (приймач + N воркерів
+# проти локальної заміни Bot API) і зводить пропускну здатність у таблицю.
+# Ліміти надсилань підняті, щоб вимірювати саме обробку, а не черги Telegram.
+#
+#   python bench/shard_scaling.py --users 2000 --shards 1 2 4 8
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(shards, args):
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'load_funnel.py'),
+        '--users', str(args.users), '--latency', str(args.latency), '--ramp', str(args.ramp),
+        '--send-rate', '1000000', '--chat-rate', '1000', '--shards', str(shards),
+    ]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    rate = float(re.search(r'updates/sec:\s+([\d.]+)', output).group(1))
+    p50, p95, p99 = map(float, re.search(r'p50/p95/p99: ([\d.]+) / ([\d.]+) / ([\d.]+)', output).groups())
+    return rate, p50, p95, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of the sharded bot by number of worker processes')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--ramp', type=float, default=0.0)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f'CPU cores: {os.cpu_count()}, users: {args.users}')
+    print(f'{"shards":>6} {"updates/s":>10} {"speedup":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    baseline = None
+    for shards in args.shards:
+        rate, p50, p95, p99 = run(shards, args)
+        baseline = baseline or rate
+        print(f'{shards:>6} {rate:>10.1f} {rate / baseline:>7.2f}x {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
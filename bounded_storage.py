@@ -0,0 +1,193 @@
+import copy
+import sys
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+# Поля анкети Form (і id повідомлення-майстра), що зберігаються у фіксованих слотах сесії
+FORM_FIELDS = ('goal', 'gender', 'age', 'height', 'weight', 'wizard_message_id')
+
+
+class Session:
+    # Компактний запис сесії: фіксовані слоти замість словника словників.
+    # Рядкові значення інтернуються, тож 'loss'/'male' спільні для всіх сесій.
+    __slots__ = ('state', 'goal', 'gender', 'age', 'height', 'weight', 'wizard_message_id',
+                 'extra', 'bucket', 'touched')
+
+    def __init__(self, now):
+        self.state = None
+        self.goal = None
+        self.gender = None
+        self.age = None
+        self.height = None
+        self.weight = None
+        self.wizard_message_id = None
+        self.extra = None
+        self.bucket = None
+        self.touched = now
+
+    def to_dict(self):
+        data = {}
+        for field in FORM_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if self.extra:
+            data.update(copy.deepcopy(self.extra))
+        return data
+
+    def update(self, data):
+        for key, value in data.items():
+            if key in FORM_FIELDS:
+                setattr(self, key, sys.intern(value) if isinstance(value, str) else value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = copy.deepcopy(value)
+
+    def clear_data(self):
+        for field in FORM_FIELDS:
+            setattr(self, field, None)
+        self.extra = None
+
+    def is_empty(self):
+        return (self.state is None and self.extra is None and self.bucket is None
+                and all(getattr(self, field) is None for field in FORM_FIELDS))
+
+
+class BoundedMemoryStorage(BaseStorage):
+    # Сховище станів у пам'яті з обмеженим розміром.
+    # Сесії, що простоюють довше за ttl секунд, видаляються; понад max_sessions
+    # витісняються найдавніше використані (LRU). Лічильники evicted_ttl та
+    # evicted_lru показують, скільки сесій було видалено.
+    #
+    # Пам'ять на активну сесію (tracemalloc, Python 3.11, 100k сесій на кроці
+    # «вага», тобто із заповненими goal/gender/age/height):
+    #   MemoryStorage        ~ 795 байт (словник чату + словник користувача + data/bucket)
+    #   BoundedMemoryStorage ~ 345 байт (Session зі слотами + ключ + вузол OrderedDict)
+
+    def __init__(self, ttl=24 * 60 * 60, max_sessions=100_000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+    async def close(self):
+        self.sessions.clear()
+
+    async def wait_closed(self):
+        pass
+
+    def _expire(self, now):
+        # Найдавніші сесії завжди на початку OrderedDict, тож перевіряємо лише їх
+        sessions = self.sessions
+        while sessions:
+            key, session = next(iter(sessions.items()))
+            if now - session.touched <= self.ttl:
+                break
+            del sessions[key]
+            self.evicted_ttl += 1
+
+    def _get(self, chat, user):
+        key = self.check_address(chat=chat, user=user)
+        session = self.sessions.get(key)
+        if session is None:
+            return key, None
+        now = time.monotonic()
+        if now - session.touched > self.ttl:
+            del self.sessions[key]
+            self.evicted_ttl += 1
+            return key, None
+        return key, session
+
+    def _touch(self, chat, user):
+        now = time.monotonic()
+        self._expire(now)
+        key, session = self._get(chat, user)
+        if session is None:
+            session = self.sessions[key] = Session(now)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted_lru += 1
+        else:
+            session.touched = now
+            self.sessions.move_to_end(key)
+        return key, session
+
+    def _cleanup(self, key, session):
+        if session.is_empty():
+            self.sessions.pop(key, None)
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        _, session = self._get(chat, user)
+        if session is None or session.state is None:
+            return self.resolve_state(default)
+        return session.state
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        _, session = self._get(chat, user)
+        return session.to_dict() if session is not None else {}
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.Optional[typing.AnyStr] = None):
+        key, session = self._touch(chat, user)
+        state = self.resolve_state(state)
+        session.state = sys.intern(state) if state is not None else None
+        self._cleanup(key, session)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key, session = self._touch(chat, user)
+        session.clear_data()
+        session.update(data or {})
+        self._cleanup(key, session)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key, session = self._touch(chat, user)
+        session.update(data or {})
+        session.update(kwargs)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        _, session = self._get(chat, user)
+        if session is None or session.bucket is None:
+            return {}
+        return copy.deepcopy(session.bucket)
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key, session = self._touch(chat, user)
+        session.bucket = copy.deepcopy(bucket) if bucket else None
+        self._cleanup(key, session)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key, session = self._touch(chat, user)
+        if session.bucket is None:
+            session.bucket = {}
+        session.bucket.update(bucket or {}, **kwargs)
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+import aiohttp
+from aiogram.utils.exceptions import (
+    BotBlocked, BotKicked, CantInitiateConversation, CantTalkWithBots, ChatNotFound, MessageNotModified,
+    NetworkError, TelegramAPIError, UserDeactivated,
+)
+
+from send_queue import BULK, send_priority
+from sqlite_thread import SQLiteThread
+
+log = logging.getLogger(__name__)
+
+# Помилки, після яких у чат більше нема сенсу писати: користувач заблокував бота,
+# видалив акаунт або чату вже не існує
+UNREACHABLE_ERRORS = (BotBlocked, BotKicked, CantInitiateConversation, CantTalkWithBots, ChatNotFound,
+                      UserDeactivated)
+# Збої мережі: доставку варто повторити
+TRANSIENT_ERRORS = (NetworkError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} год {minutes} хв"
+    if minutes:
+        return f"{minutes} хв {seconds} с"
+    return f"{seconds} с"
+
+
+class Progress:
+    __slots__ = ('total', 'sent', 'blocked', 'failed', 'started', 'report_message_id')
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        # Повідомлення зі звітом, яке оновлюється під час розсилки
+        self.report_message_id = None
+
+    @property
+    def done(self):
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def rate(self):
+        return self.done / max(time.monotonic() - self.started, 1e-9)
+
+    @property
+    def eta(self):
+        return (self.total - self.done) / self.rate if self.done else None
+
+    def __str__(self):
+        eta = self.eta
+        return (f"Надіслано {self.sent} з {self.total} (заблокували бота: {self.blocked}, помилок: {self.failed})\n"
+                f"{self.rate:.1f} повідомл./с, залишилось ~{format_eta(eta) if eta is not None else '?'}")
+
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS chats ('
+    ' chat INTEGER PRIMARY KEY, started REAL NOT NULL, blocked REAL);'
+    'CREATE TABLE IF NOT EXISTS broadcasts ('
+    ' id TEXT PRIMARY KEY, created REAL NOT NULL, message TEXT NOT NULL,'
+    ' report_chat INTEGER, finished REAL);'
+    'CREATE TABLE IF NOT EXISTS deliveries ('
+    ' broadcast TEXT NOT NULL, chat INTEGER NOT NULL, status TEXT NOT NULL,'
+    ' PRIMARY KEY (broadcast, chat));'
+)
+
+
+class Broadcaster:
+    # Масові розсилки «новин і порад» усім, хто запускав бота.
+    # Реєстр чатів, розсилки та журнал доставки — у локальному файлі SQLite.
+    # Кожна доставка записується одразу після відповіді Telegram, тож розсилка,
+    # перервана падінням чи перевикладкою, продовжується з того ж місця:
+    # повторно може прийти лише те, що було в дорозі в момент падіння.
+    # Надсилання йде через спільну SendQueue з пріоритетом BULK, тож ліміти
+    # Telegram дотримуються, а відповіді користувачам обганяють розсилку.
+    # Чати, що заблокували бота, позначаються і надалі пропускаються.
+    # Розсилки виконує лише процес з runner=True (у шардованому режимі — воркер 0);
+    # інші процеси тільки записують нову розсилку, а виконавець підхоплює її (start_watching).
+
+    def __init__(self, path, bot, images, keyboards, runner=True, concurrency=50, page_size=500,
+                 report_interval=5, retries=2, retry_delay=1.0):
+        self.path = path
+        self.runner = runner
+        self.bot = bot
+        self.images = images
+        self.keyboards = keyboards
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.progress = {}
+        self._tasks = {}
+        self._watcher = None
+        self._sqlite = SQLiteThread(path, SCHEMA, 'broadcast')
+
+    # --- робота з диском (виконується в потоці SQLiteThread) ---
+
+    def _execute(self, sql, params=()):
+        conn = self._sqlite.db()
+        with conn:
+            conn.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        return self._sqlite.db().execute(sql, params).fetchall()
+
+    # --- реєстр чатів ---
+
+    async def remember_chat(self, chat_id):
+        # Повторний /start після блокування знову вмикає чат у розсилки.
+        # Без кешу в пам'яті: блокування позначає процес-виконавець розсилок,
+        # а /start того ж чату може прийти в інший шард
+        await self._sqlite.run(self._execute,
+                               'INSERT INTO chats (chat, started) VALUES (?, ?)'
+                               ' ON CONFLICT (chat) DO UPDATE SET blocked = NULL WHERE blocked IS NOT NULL',
+                               (chat_id, time.time()))
+
+    async def forget_chat(self, chat_id):
+        await self._sqlite.run(self._execute, 'UPDATE chats SET blocked = ? WHERE chat = ?', (time.time(), chat_id))
+
+    # --- розсилки ---
+
+    async def start(self, text, image=None, keyboard=None, report_chat=None):
+        if image is not None and image not in self.images.paths:
+            raise ValueError(f"Unknown image {image!r}")
+        if keyboard is not None and keyboard not in self.keyboards:
+            raise ValueError(f"Unknown keyboard {keyboard!r}")
+        broadcast_id = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        message = json.dumps({'text': text, 'image': image, 'keyboard': keyboard}, ensure_ascii=False)
+        await self._sqlite.run(self._execute,
+                               'INSERT INTO broadcasts (id, created, message, report_chat) VALUES (?, ?, ?, ?)',
+                               (broadcast_id, time.time(), message, report_chat))
+        if self.runner:
+            self._spawn(broadcast_id)
+        return broadcast_id
+
+    async def resume(self):
+        # Запускає всі незавершені розсилки: після перезапуску вони продовжуються з місця зупинки
+        rows = await self._sqlite.run(self._query, 'SELECT id FROM broadcasts WHERE finished IS NULL ORDER BY created')
+        for (broadcast_id,) in rows:
+            if broadcast_id not in self._tasks:
+                log.info('Starting broadcast %s', broadcast_id)
+                self._spawn(broadcast_id)
+
+    def start_watching(self, interval=5):
+        self._watcher = asyncio.get_running_loop().create_task(self._watch(interval))
+
+    async def _watch(self, interval):
+        while True:
+            try:
+                await self.resume()
+            except Exception:
+                log.exception('Failed to check for pending broadcasts')
+            await asyncio.sleep(interval)
+
+    def _spawn(self, broadcast_id):
+        if broadcast_id not in self._tasks:
+            task = asyncio.get_running_loop().create_task(self._broadcast(broadcast_id))
+            self._tasks[broadcast_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def close(self):
+        await self.stop()
+        await self._sqlite.close()
+        self._sqlite.shutdown()
+
+    async def _pending(self, broadcast_id, after, limit):
+        # Наступна сторінка чатів, яким ця розсилка ще нічого не доставила (за зростанням id)
+        rows = await self._sqlite.run(self._query,
+                                      'SELECT chat FROM chats WHERE blocked IS NULL AND chat > ?'
+                                      ' AND chat NOT IN (SELECT chat FROM deliveries WHERE broadcast = ?)'
+                                      ' ORDER BY chat LIMIT ?', (after, broadcast_id, limit))
+        return [chat for (chat,) in rows]
+
+    async def _count_pending(self, broadcast_id):
+        rows = await self._sqlite.run(self._query,
+                                      'SELECT COUNT(*) FROM chats WHERE blocked IS NULL'
+                                      ' AND chat NOT IN (SELECT chat FROM deliveries WHERE broadcast = ?)',
+                                      (broadcast_id,))
+        return rows[0][0]
+
+    async def _send(self, chat_id, message):
+        keyboard = self.keyboards[message['keyboard']] if message['keyboard'] else None
+        if message['image']:
+            try:
+                return await self.images.send_photo(self.bot, chat_id, message['image'],
+                                                    caption=message['text'], reply_markup=keyboard)
+            except FileNotFoundError:
+                pass
+        return await self.bot.send_message(chat_id, message['text'], reply_markup=keyboard)
+
+    async def _send_with_retries(self, chat_id, message):
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._send(chat_id, message)
+            except TRANSIENT_ERRORS:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    async def _deliver(self, broadcast_id, chat_id, message, progress):
+        # Будь-який результат записується в журнал: інакше розсилка завершилася б,
+        # мовчки оминувши цей чат
+        try:
+            await self._send_with_retries(chat_id, message)
+        except UNREACHABLE_ERRORS:
+            status = 'blocked'
+            progress.blocked += 1
+            await self.forget_chat(chat_id)
+        except (TelegramAPIError, *TRANSIENT_ERRORS) as e:
+            status = 'failed'
+            progress.failed += 1
+            log.warning('Broadcast %s to chat %s failed: %r', broadcast_id, chat_id, e)
+        except Exception:
+            status = 'failed'
+            progress.failed += 1
+            log.exception('Broadcast %s to chat %s failed', broadcast_id, chat_id)
+        else:
+            status = 'sent'
+            progress.sent += 1
+        await self._sqlite.run(self._execute,
+                               'INSERT OR REPLACE INTO deliveries (broadcast, chat, status) VALUES (?, ?, ?)',
+                               (broadcast_id, chat_id, status))
+
+    async def _broadcast(self, broadcast_id):
+        (raw, report_chat), = await self._sqlite.run(
+            self._query, 'SELECT message, report_chat FROM broadcasts WHERE id = ?', (broadcast_id,))
+        message = json.loads(raw)
+        progress = self.progress[broadcast_id] = Progress(await self._count_pending(broadcast_id))
+        reporter = asyncio.get_running_loop().create_task(self._report(broadcast_id, progress, report_chat))
+
+        # Усі запити цієї задачі — з пріоритетом розсилки
+        send_priority.set(BULK)
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+
+        def release(task):
+            running.discard(task)
+            slots.release()
+
+        after = -2 ** 63
+        try:
+            while True:
+                page = await self._pending(broadcast_id, after, self.page_size)
+                if not page:
+                    break
+                for chat_id in page:
+                    await slots.acquire()
+                    task = asyncio.get_running_loop().create_task(
+                        self._deliver(broadcast_id, chat_id, message, progress))
+                    running.add(task)
+                    task.add_done_callback(release)
+                after = page[-1]
+            if running:
+                await asyncio.wait(running)
+            await self._sqlite.run(self._execute, 'UPDATE broadcasts SET finished = ? WHERE id = ?',
+                                   (time.time(), broadcast_id))
+            log.info('Broadcast %s finished: %s', broadcast_id, progress)
+        finally:
+            reporter.cancel()
+            if running:
+                # Дочікуємося відповідей на вже надіслані запити, щоб записати доставку
+                await asyncio.wait(running, timeout=10)
+        await self._report_once(broadcast_id, progress, report_chat, finished=True)
+
+    async def _report_once(self, broadcast_id, progress, report_chat, finished=False):
+        title = "✅ Розсилку завершено" if finished else "📣 Розсилка триває"
+        text = f"{title} ({broadcast_id})\n{progress}"
+        log.info('%s', text.replace('\n', ' | '))
+        if report_chat is None:
+            return
+        try:
+            if progress.report_message_id is None:
+                progress.report_message_id = (await self.bot.send_message(report_chat, text)).message_id
+            else:
+                await self.bot.edit_message_text(text, report_chat, progress.report_message_id)
+        except MessageNotModified:
+            pass
+        except TelegramAPIError:
+            log.exception('Failed to report broadcast progress')
+
+    async def _report(self, broadcast_id, progress, report_chat):
+        # Живий звіт: пропускна здатність і час до завершення
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await self._report_once(broadcast_id, progress, report_chat)
@@ -0,0 +1,67 @@
+from aiogram import Dispatcher, types
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.handler import ctx_data
+from aiogram.dispatcher.webhook import AnswerCallbackQuery
+
+# Формат callback_data: «префікс_дані», наприклад goal_loss, act_1.55, back_age.
+# Кнопки без даних (home) мають лише префікс.
+ANY_STATE = '*'
+
+
+def parse_callback_data(data):
+    prefix, _, payload = (data or '').partition('_')
+    return prefix, payload
+
+
+class CallbackRouter:
+    # Таблиця маршрутів (стан, префікс) → обробник.
+    # Замість ланцюжка lambda-фільтрів, які aiogram перевіряє по черзі,
+    # один обробник callback_query знаходить потрібну функцію одним
+    # пошуком у словнику, тож вартість не залежить від кількості кнопок.
+    # Обробник викликається як handler(callback, state, payload); на сам
+    # callback відповідає маршрутизатор після обробника.
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, prefix, state=ANY_STATE, payloads=None):
+        # payloads — допустимі значення даних; кнопки з іншими даними ігноруються
+        state = getattr(state, 'state', state)
+        allowed = frozenset(payloads) if payloads is not None else None
+
+        def decorator(handler):
+            key = (state, prefix)
+            if key in self.routes:
+                raise ValueError(f"Callback route {key} is already registered")
+            self.routes[key] = (handler, allowed)
+            return handler
+        return decorator
+
+    def resolve(self, state, data):
+        prefix, payload = parse_callback_data(data)
+        entry = self.routes.get((state, prefix)) or self.routes.get((ANY_STATE, prefix))
+        if entry is None:
+            return None, payload
+        handler, allowed = entry
+        if allowed is not None and payload not in allowed:
+            return None, payload
+        return handler, payload
+
+    async def dispatch(self, callback: types.CallbackQuery, state: FSMContext):
+        handler, payload = self.resolve(await state.get_state(), callback.data)
+        if handler is None:
+            # Застаріла кнопка або кнопка з іншого кроку: просто прибираємо «годинник»
+            await callback.answer()
+            return
+        # Для метрик і трасування: який саме обробник обрано
+        ctx_data.get()['callback_handler'] = handler
+        response = await handler(callback, state, payload)
+        if response is None:
+            # Слот відповіді вільний: у режимі вебхука answerCallbackQuery
+            # піде прямо у відповіді на запит Telegram
+            return AnswerCallbackQuery(callback.id)
+        await callback.answer()
+        return response
+
+    def register(self, dp: Dispatcher):
+        dp.register_callback_query_handler(self.dispatch, state=ANY_STATE)
@@ -0,0 +1,130 @@
+# Пакетний розрахунок калорій для цілих когорт користувачів.
+# Ті самі формули, що й calculate_bmr / goal_calories у calorie_core, але над
+# масивами NumPy за один векторизований прохід. Результати збігаються зі
+# скалярним шляхом до біта (порядок операцій у формулі той самий).
+#
+# Потребує numpy (і pyarrow для Parquet) — боту вони не потрібні, тому не в requirements.txt.
+#
+#   python calorie_batch.py cohort.csv targets.csv --chunk-size 100000
+import argparse
+import csv
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from calorie_core import ACTIVITY_FACTORS
+
+INPUT_COLUMNS = ('weight', 'height', 'age', 'gender', 'activity', 'goal')
+OUTPUT_COLUMNS = ('bmr', 'tdee', 'calories')
+
+BatchResult = namedtuple('BatchResult', OUTPUT_COLUMNS)
+ACTIVITY_FACTORS_ARRAY = np.array(list(ACTIVITY_FACTORS.values()))
+
+
+def _parse_factor(code):
+    try:
+        return float(code)
+    except ValueError:
+        return np.nan
+
+
+def calculate_batch(weight, height, age, gender, activity, goal):
+    weight = np.asarray(weight, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    age = np.asarray(age, dtype=np.float64)
+    gender = np.asarray(gender)
+    activity = np.asarray(activity)
+    goal = np.asarray(goal)
+
+    # Коди порівнюємо як числа, а не як рядки: у файлі може бути «1.550» або 1.55 з Parquet
+    try:
+        factor = activity.astype(np.float64)
+    except ValueError:
+        factor = np.array([_parse_factor(code) for code in activity.ravel()]).reshape(activity.shape)
+    unknown = ~np.isin(factor, ACTIVITY_FACTORS_ARRAY)
+    if unknown.any():
+        raise ValueError(f"Unknown activity code: {activity[unknown][0]!r}")
+
+    bmr = 9.99 * weight + 6.25 * height - 4.92 * age + np.where(gender == 'male', 5, -161)
+    tdee = bmr * factor
+    # Як і в боті: усе, що не loss/maintain, вважається набором ваги
+    calories = np.where(goal == 'loss', tdee - 500, np.where(goal == 'maintain', tdee, tdee + 500))
+    return BatchResult(bmr, tdee, calories)
+
+
+def _compute_columns(columns):
+    result = calculate_batch(*(columns[name] for name in INPUT_COLUMNS))
+    return dict(zip(OUTPUT_COLUMNS, result))
+
+
+def process_csv(src, dst, chunk_size):
+    # Читає CSV шматками по chunk_size рядків, тож пам'ять не залежить від розміру файлу
+    with open(src, newline='', encoding='utf-8') as fin, open(dst, 'w', newline='', encoding='utf-8') as fout:
+        reader = csv.reader(fin)
+        header = next(reader)
+        missing = [name for name in INPUT_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        index = [header.index(name) for name in INPUT_COLUMNS]
+        writer = csv.writer(fout)
+        writer.writerow(header + list(OUTPUT_COLUMNS))
+
+        total = 0
+        while True:
+            rows = [row for _, row in zip(range(chunk_size), reader)]
+            if not rows:
+                break
+            columns = {name: [row[i] for row in rows] for name, i in zip(INPUT_COLUMNS, index)}
+            out = _compute_columns(columns)
+            writer.writerows(
+                row + [f'{b:.2f}', f'{t:.2f}', f'{c:.0f}']
+                for row, b, t, c in zip(rows, out['bmr'], out['tdee'], out['calories'])
+            )
+            total += len(rows)
+        return total
+
+
+def process_parquet(src, dst, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet support requires pyarrow: pip install pyarrow")
+
+    source = pq.ParquetFile(src)
+    writer = None
+    total = 0
+    try:
+        for batch in source.iter_batches(batch_size=chunk_size):
+            columns = {name: batch.column(name).to_numpy(zero_copy_only=False) for name in INPUT_COLUMNS}
+            out = _compute_columns(columns)
+            table = pa.Table.from_batches([batch])
+            for name in OUTPUT_COLUMNS:
+                table = table.append_column(name, pa.array(out[name]))
+            if writer is None:
+                writer = pq.ParquetWriter(dst, table.schema)
+            writer.write_table(table)
+            total += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute BMR, TDEE and goal calories for a cohort file')
+    parser.add_argument('src', help='input .csv or .parquet with columns: ' + ', '.join(INPUT_COLUMNS))
+    parser.add_argument('dst', help='output file in the same format')
+    parser.add_argument('--chunk-size', type=int, default=100_000, help='rows processed per chunk')
+    args = parser.parse_args(argv)
+
+    if args.src.endswith('.parquet'):
+        total = process_parquet(args.src, args.dst, args.chunk_size)
+    else:
+        total = process_csv(args.src, args.dst, args.chunk_size)
+    print(f'{total} rows written to {args.dst}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+# Ядро калькулятора калорій: формули BMR/TDEE/мети, профіль і кроки анкети.
+# Чистий Python без aiogram і без токена — імпортується за мілісекунди, тож
+# його використовують і бот (BOT.py — лише адаптер до Telegram), і пакетні
+# розрахунки, і бенчмарки.
+from calorie_core.flow import (CALC_GENDERS, CALC_GOALS, CALC_LIMITS, STEPS, STEP_BY_NAME, Step, next_step,
+                               parse_answer, parse_calc_query, parse_profile_value, previous_step)
+from calorie_core.formulas import (ACTIVITY_CODES, ACTIVITY_FACTORS, GENDERS, GOALS, Profile, activity_factor,
+                                   calculate_bmr, daily_calories, goal_calories)
+
+__all__ = [
+    'ACTIVITY_CODES', 'ACTIVITY_FACTORS', 'CALC_GENDERS', 'CALC_GOALS', 'CALC_LIMITS', 'GENDERS', 'GOALS',
+    'Profile', 'STEPS', 'STEP_BY_NAME', 'Step', 'activity_factor', 'calculate_bmr', 'daily_calories',
+    'goal_calories', 'next_step', 'parse_answer', 'parse_calc_query', 'parse_profile_value', 'previous_step',
+]
@@ -0,0 +1,101 @@
+import re
+from collections import namedtuple
+
+from calorie_core.formulas import ACTIVITY_CODES, GENDERS, GOALS
+
+# Крок анкети: поле профілю, питання і допустимі відповіді.
+# choices — значення кнопок; у текстових кроків (вік, зріст, вага) їх немає,
+# відповідь — число з повідомлення, яке розбирає parse_answer
+Step = namedtuple('Step', 'name prompt choices')
+
+STEPS = (
+    Step('goal', "Яка Ваша ціль?", GOALS),
+    Step('gender', "Оберіть стать:", GENDERS),
+    Step('age', "Скільки Вам років?", None),
+    Step('height', "Який Ваш зріст (см)?", None),
+    Step('weight', "Яка Ваша вага (кг)?", None),
+    Step('activity', "Оцініть свій рівень активності:", ACTIVITY_CODES),
+)
+STEP_BY_NAME = {step.name: step for step in STEPS}
+_STEP_INDEX = {step.name: i for i, step in enumerate(STEPS)}
+
+
+def next_step(name):
+    # Назва наступного кроку; None після останнього
+    i = _STEP_INDEX[name] + 1
+    return STEPS[i].name if i < len(STEPS) else None
+
+
+def previous_step(name):
+    # Назва попереднього кроку; None для першого (назад — на стартовий екран)
+    i = _STEP_INDEX[name]
+    return STEPS[i - 1].name if i else None
+
+
+def parse_answer(name, text):
+    # Відповідь текстового кроку або None: вік — ціле число, зріст і вага — можна з крапкою
+    text = text or ''
+    if name == 'age':
+        return int(text) if text.isdecimal() else None
+    return float(text) if text.replace('.', '', 1).isdecimal() else None
+
+
+# Зміна одного поля профілю повідомленням: «вага 78», «78 кг», «зріст 181», «181 см», «вік 31», «31 р»
+PROFILE_VALUE_RE = re.compile(r'^\s*(вік|age|зріст|height|вага|weight)?\s*(\d+(?:[.,]\d+)?)\s*'
+                              r'(років|роки|рік|р|см|cm|кг|kg)?\.?\s*$', re.IGNORECASE)
+PROFILE_WORDS = {'вік': 'age', 'age': 'age', 'років': 'age', 'роки': 'age', 'рік': 'age', 'р': 'age',
+                 'зріст': 'height', 'height': 'height', 'см': 'height', 'cm': 'height',
+                 'вага': 'weight', 'weight': 'weight', 'кг': 'weight', 'kg': 'weight'}
+
+
+def parse_profile_value(text):
+    # Повертає (поле, значення) або None, якщо не зрозуміло, яке поле змінюється
+    match = PROFILE_VALUE_RE.match(text or '')
+    if not match:
+        return None
+    word, number, unit = match.groups()
+    fields = {PROFILE_WORDS[w.lower()] for w in (word, unit) if w}
+    value = float(number.replace(',', '.'))
+    if len(fields) != 1 or value <= 0:
+        return None
+    field = fields.pop()
+    return field, int(value) if field == 'age' else value
+
+
+# Розрахунок одним рядком: «80 180 30 m 1.55 loss» — вага, зріст, вік (саме в
+# такому порядку), стать, активність і, за бажанням, мета
+CALC_GENDERS = {'m': 'male', 'male': 'male', 'ч': 'male', 'чол': 'male',
+                'f': 'female', 'female': 'female', 'ж': 'female', 'жін': 'female'}
+CALC_GOALS = {'loss': 'loss', 'maintain': 'maintain', 'gain': 'gain',
+              'схуднення': 'loss', 'підтримка': 'maintain', 'набір': 'gain'}
+CALC_LIMITS = ((20, 400), (50, 260), (10, 120))
+
+
+def parse_calc_query(text):
+    # (вага, зріст, вік, стать, код активності, мета або None) або None.
+    # Вага округлюється до 0,5 кг, зріст — до сантиметра, активність — до
+    # найближчого рівня з анкети: близькі запити дають один ключ кешу
+    numbers, gender, activity, goal = [], None, None, None
+    for token in text.lower().split():
+        if token in CALC_GENDERS:
+            gender = CALC_GENDERS[token]
+        elif token in CALC_GOALS:
+            goal = CALC_GOALS[token]
+        else:
+            try:
+                value = float(token.replace(',', '.'))
+            except ValueError:
+                return None
+            if 1 < value < 2:
+                nearest = min(ACTIVITY_CODES, key=lambda code: abs(float(code) - value))
+                if abs(float(nearest) - value) > 0.1:
+                    return None
+                activity = nearest
+            else:
+                numbers.append(value)
+    if len(numbers) != 3 or gender is None or activity is None:
+        return None
+    if not all(low <= value <= high for value, (low, high) in zip(numbers, CALC_LIMITS)):
+        return None
+    weight, height, age = numbers
+    return round(weight * 2) / 2, float(round(height)), int(age), gender, activity, goal
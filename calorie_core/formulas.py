@@ -0,0 +1,32 @@
+from collections import namedtuple
+
+# Дані з анкети, за якими рахується добова норма; activity — код коефіцієнта ('1.55')
+Profile = namedtuple('Profile', 'goal gender age height weight activity')
+
+GOALS = ('loss', 'maintain', 'gain')
+GENDERS = ('male', 'female')
+# Коди рівнів активності з клавіатури бота (act_<код>) і їхні коефіцієнти
+ACTIVITY_FACTORS = {'1.2': 1.2, '1.375': 1.375, '1.55': 1.55, '1.725': 1.725, '1.9': 1.9}
+ACTIVITY_CODES = tuple(ACTIVITY_FACTORS)
+
+
+# Формула Міффліна — Сан Жеора; порядок операцій той самий, що й у calorie_batch
+def calculate_bmr(weight, height, age, gender):
+    return 9.99 * weight + 6.25 * height - 4.92 * age + (5 if gender == 'male' else -161)
+
+
+def activity_factor(code):
+    return ACTIVITY_FACTORS.get(code)
+
+
+def goal_calories(tdee, goal):
+    if goal == 'loss':
+        return tdee - 500
+    if goal == 'maintain':
+        return tdee
+    return tdee + 500
+
+
+def daily_calories(profile):
+    bmr = calculate_bmr(profile.weight, profile.height, profile.age, profile.gender)
+    return goal_calories(bmr * activity_factor(profile.activity), profile.goal)
@@ -0,0 +1,247 @@
+import datetime
+import logging
+import math
+import time
+from collections import OrderedDict, namedtuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from calorie_core import Profile
+from sqlite_thread import SQLiteThread
+
+log = logging.getLogger(__name__)
+
+# Підсумки за день або тиждень: калорії, білки, жири, вуглеводи (г) і кількість записів
+Totals = namedtuple('Totals', 'kcal protein fat carbs count')
+EMPTY = Totals(0.0, 0.0, 0.0, 0.0, 0)
+
+# Склад запису: назва, калорії і (необов'язково) білки, жири, вуглеводи
+Entry = namedtuple('Entry', 'name kcal protein fat carbs')
+
+# Межі одного запису: лог лише дописується, тож хибне значення (inf, 1e300)
+# зіпсувало б підсумки дня й тижня назавжди
+MAX_ENTRY_KCAL = 10_000
+MAX_ENTRY_GRAMS = 2_000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' id INTEGER PRIMARY KEY, user INTEGER NOT NULL, at REAL NOT NULL, day TEXT NOT NULL,'
+    ' name TEXT NOT NULL, kcal REAL NOT NULL, protein REAL NOT NULL, fat REAL NOT NULL, carbs REAL NOT NULL);'
+    'CREATE INDEX IF NOT EXISTS entries_user_day ON entries (user, day);'
+    'CREATE TABLE IF NOT EXISTS totals ('
+    ' user INTEGER NOT NULL, period TEXT NOT NULL,'
+    ' kcal REAL NOT NULL, protein REAL NOT NULL, fat REAL NOT NULL, carbs REAL NOT NULL,'
+    ' count INTEGER NOT NULL, PRIMARY KEY (user, period));'
+    'CREATE TABLE IF NOT EXISTS targets ('
+    ' user INTEGER PRIMARY KEY, kcal REAL NOT NULL, updated REAL NOT NULL);'
+    'CREATE TABLE IF NOT EXISTS profiles ('
+    ' user INTEGER PRIMARY KEY, goal TEXT NOT NULL, gender TEXT NOT NULL, age INTEGER NOT NULL,'
+    ' height REAL NOT NULL, weight REAL NOT NULL, activity TEXT NOT NULL, updated REAL NOT NULL);'
+)
+
+
+def parse_entry(text):
+    # «гречка з маслом 250 9 4 50» → Entry; числа в кінці — ккал і, можливо, Б/Ж/В.
+    # Кома як десятковий роздільник теж підходить. None, якщо калорій немає.
+    words = (text or '').split()
+    numbers = []
+    while words and len(numbers) < 4:
+        try:
+            numbers.insert(0, float(words[-1].replace(',', '.')))
+        except ValueError:
+            break
+        words.pop()
+    if not numbers or not words or not all(math.isfinite(n) and n >= 0 for n in numbers):
+        return None
+    kcal, *macros = numbers
+    if kcal > MAX_ENTRY_KCAL or any(grams > MAX_ENTRY_GRAMS for grams in macros):
+        return None
+    macros += [0.0] * (3 - len(macros))
+    return Entry(' '.join(words), kcal, *macros)
+
+
+def load_timezone(name):
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        log.warning('Time zone %s is not available, diary days follow UTC', name)
+        return datetime.timezone.utc
+
+
+class FoodDiary:
+    # Щоденник харчування у локальному файлі SQLite.
+    # Записи лише додаються в журнал entries і ніколи не переписуються.
+    # Разом із кожним записом в одній транзакції збільшуються підсумки дня і
+    # тижня в таблиці totals, тож «скільки з'їдено сьогодні» — це один пошук
+    # за ключем (і далі з кешу в пам'яті), а не перерахунок історії.
+    # Ціль (добова норма з розрахунку в анкеті) зберігається в targets, а
+    # відповіді анкети — в profiles, щоб норму можна було перерахувати,
+    # змінивши одне поле, без повторного проходження анкети.
+    # Кеші в пам'яті — LRU на max_cached ключів кожен (разом із тими, кого в базі немає).
+    # shared=True — файл пишуть і інші процеси: воркери шардів отримують оновлення
+    # за chat_id, тож той самий користувач в особистому чаті й у групі потрапляє
+    # до різних воркерів. Тоді перед кожним читанням перевіряється PRAGMA data_version,
+    # і після чужої транзакції кеші скидаються.
+
+    def __init__(self, path, tz='Europe/Kyiv', shared=False, max_cached=10_000):
+        self.path = path
+        self.tz = load_timezone(tz) if isinstance(tz, str) else tz
+        self.shared = shared
+        self.max_cached = max_cached
+        self._sqlite = SQLiteThread(path, SCHEMA, 'food-diary')
+        self._version = None
+        self._totals = OrderedDict()
+        self._day = None
+        self._targets = OrderedDict()
+        self._profiles = OrderedDict()
+
+    # --- робота з диском (виконується в потоці SQLiteThread) ---
+
+    def _append(self, user, at, periods, entry):
+        conn = self._sqlite.db()
+        with conn:
+            conn.execute(
+                'INSERT INTO entries (user, at, day, name, kcal, protein, fat, carbs) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (user, at, periods[0], *entry),
+            )
+            conn.executemany(
+                'INSERT INTO totals (user, period, kcal, protein, fat, carbs, count) VALUES (?, ?, ?, ?, ?, ?, 1)'
+                ' ON CONFLICT (user, period) DO UPDATE SET'
+                ' kcal = kcal + excluded.kcal, protein = protein + excluded.protein,'
+                ' fat = fat + excluded.fat, carbs = carbs + excluded.carbs, count = count + 1',
+                [(user, period, *entry[1:]) for period in periods],
+            )
+
+    def _read_totals(self, user, periods):
+        rows = dict.fromkeys(periods, EMPTY)
+        for period, *values in self._sqlite.db().execute(
+            f'SELECT period, kcal, protein, fat, carbs, count FROM totals'
+            f' WHERE user = ? AND period IN ({",".join("?" * len(periods))})', (user, *periods),
+        ):
+            rows[period] = Totals(*values)
+        return rows
+
+    def _read_target(self, user):
+        row = self._sqlite.db().execute('SELECT kcal FROM targets WHERE user = ?', (user,)).fetchone()
+        return row[0] if row else None
+
+    def _write_target(self, user, kcal):
+        conn = self._sqlite.db()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO targets (user, kcal, updated) VALUES (?, ?, ?)',
+                         (user, kcal, time.time()))
+
+    def _read_profile(self, user):
+        row = self._sqlite.db().execute(
+            'SELECT goal, gender, age, height, weight, activity FROM profiles WHERE user = ?', (user,)).fetchone()
+        return Profile(*row) if row else None
+
+    def _write_profile(self, user, profile, kcal):
+        # Профіль і розрахована з нього ціль змінюються разом
+        now = time.time()
+        conn = self._sqlite.db()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO profiles (user, goal, gender, age, height, weight, activity, updated)'
+                         ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (user, *profile, now))
+            conn.execute('INSERT OR REPLACE INTO targets (user, kcal, updated) VALUES (?, ?, ?)', (user, kcal, now))
+
+    def _data_version(self):
+        # Змінюється лише після транзакцій інших з'єднань, не власних
+        return self._sqlite.db().execute('PRAGMA data_version').fetchone()[0]
+
+    # --- кеші ---
+
+    async def _sync(self):
+        if not self.shared:
+            return
+        version = await self._sqlite.run(self._data_version)
+        if version != self._version:
+            self._version = version
+            self._totals.clear()
+            self._targets.clear()
+            self._profiles.clear()
+
+    def _cached(self, cache, key):
+        # (є в кеші, значення); значенням може бути й None — «у базі немає»
+        if key not in cache:
+            return False, None
+        cache.move_to_end(key)
+        return True, cache[key]
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.max_cached:
+            cache.popitem(last=False)
+
+    # --- публічний інтерфейс ---
+
+    def periods(self, at=None):
+        # Ключі підсумків: календарний день і ISO-тиждень у часовому поясі щоденника
+        moment = datetime.datetime.fromtimestamp(at if at is not None else time.time(), self.tz)
+        year, week, _ = moment.isocalendar()
+        return f'd:{moment.date().isoformat()}', f'w:{year}-W{week:02d}'
+
+    async def totals(self, user, at=None):
+        # (за день, за тиждень); з диска читається лише перший раз за період
+        periods = self.periods(at)
+        await self._sync()
+        if periods[0] != self._day:
+            # Новий день: підсумки минулих періодів у кеші більше не потрібні
+            self._day = periods[0]
+            self._totals = OrderedDict((key, totals) for key, totals in self._totals.items() if key[1] in periods)
+        found = {}
+        for period in periods:
+            cached, totals = self._cached(self._totals, (user, period))
+            if cached:
+                found[period] = totals
+        missing = [period for period in periods if period not in found]
+        if missing:
+            for period, totals in (await self._sqlite.run(self._read_totals, user, missing)).items():
+                # Поки читали з диска, add() міг уже заповнити кеш
+                cached, current = self._cached(self._totals, (user, period))
+                found[period] = current if cached else totals
+                self._remember(self._totals, (user, period), found[period])
+        return tuple(found[period] for period in periods)
+
+    async def add(self, user, entry, at=None):
+        at = at if at is not None else time.time()
+        periods = self.periods(at)
+        # Кеш має бути заповнений до запису, інакше додамо запис двічі
+        await self.totals(user, at)
+        await self._sqlite.run(self._append, user, at, periods, tuple(entry))
+        for period in periods:
+            current = self._totals.get((user, period))
+            if current is not None:
+                kcal, protein, fat, carbs, count = current
+                self._totals[user, period] = Totals(kcal + entry.kcal, protein + entry.protein,
+                                                    fat + entry.fat, carbs + entry.carbs, count + 1)
+        return await self.totals(user, at)
+
+    async def target(self, user):
+        await self._sync()
+        cached, kcal = self._cached(self._targets, user)
+        if not cached:
+            kcal = await self._sqlite.run(self._read_target, user)
+            self._remember(self._targets, user, kcal)
+        return kcal
+
+    async def set_target(self, user, kcal):
+        await self._sqlite.run(self._write_target, user, kcal)
+        self._remember(self._targets, user, kcal)
+
+    async def profile(self, user):
+        await self._sync()
+        cached, profile = self._cached(self._profiles, user)
+        if not cached:
+            profile = await self._sqlite.run(self._read_profile, user)
+            self._remember(self._profiles, user, profile)
+        return profile
+
+    async def save_profile(self, user, profile, kcal):
+        await self._sqlite.run(self._write_profile, user, tuple(profile), kcal)
+        self._remember(self._profiles, user, profile)
+        self._remember(self._targets, user, kcal)
+
+    async def close(self):
+        await self._sqlite.close()
+        self._sqlite.shutdown()
@@ -0,0 +1,284 @@
+# Пошук продуктів за назвою (українською чи англійською) у вбудованій таблиці
+# калорійності foods/foods.csv.
+#
+# Таблиця компілюється в компактний бінарний індекс, який відкривається через
+# mmap: запуск не читає й не розбирає файл, а воркери шардованого режиму
+# ділять ті самі сторінки пам'яті. Індекс має дві частини:
+#   * відсортований масив ключів (назва і кожен її «хвіст» від початку слова)
+#     для пошуку за префіксом двійковим пошуком — «греч», «масло в», «вершк»;
+#   * триграмний індекс (crc32 триграми → список продуктів) для запитів з
+#     помилками — «гречкаа», «бананн», «chiken».
+#
+#   python food_index.py foods/foods.csv data/foods.idx      # зібрати індекс
+#   python food_index.py data/foods.idx --search "греча"     # перевірити пошук
+import argparse
+import bisect
+import csv
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter, namedtuple
+
+from atomic_file import atomic_write
+
+# Значення на 100 г продукту
+Food = namedtuple('Food', 'id name_uk name_en kcal protein fat carbs')
+
+# Масиви індексу записуються в порядку байтів машини, тож індекс — локальний
+# артефакт збирання, а не файл для перенесення між архітектурами
+MAGIC = b'FOODIDX1'
+HEADER = struct.Struct('<8s12I')
+FOOD = struct.Struct('<IIIIffff')
+
+# Мінімальна частка триграм запиту, що мають знайтися в назві, для нечіткого збігу
+MIN_SIMILARITY = 0.5
+# Скільки ключів з однаковим префіксом переглядати для ранжування
+PREFIX_SCAN = 256
+# Старший біт id продукту в масиві ключів: ключ — хвіст назви, а не вся назва
+TAIL_FLAG = 1 << 31
+
+_APOSTROPHES = re.compile("['’ʼ`]")
+_NON_WORD = re.compile(r'[^\w%.]+')
+
+
+def normalize(text):
+    text = _APOSTROPHES.sub('', text.lower().replace('ё', 'е'))
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_hash(trigram):
+    return zlib.crc32(trigram.encode())
+
+
+def _keys(name):
+    # Повна назва і кожен її хвіст, що починається з нового слова
+    words = name.split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def build_index(csv_path, index_path):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    strings = bytearray()
+    foods = bytearray()
+    keys = []
+    postings = {}
+    trigram_counts = array('I')
+    for food_id, row in enumerate(rows):
+        fields = []
+        for column in ('name_uk', 'name_en'):
+            encoded = row[column].strip().encode()
+            fields += [len(strings), len(encoded)]
+            strings += encoded
+        foods += FOOD.pack(*fields, *(float(row[column]) for column in ('kcal', 'protein', 'fat', 'carbs')))
+
+        grams = set()
+        for column in ('name_uk', 'name_en'):
+            name = normalize(row[column])
+            keys += [(key.encode(), food_id | (TAIL_FLAG if i else 0)) for i, key in enumerate(_keys(name))]
+            grams |= trigrams(name)
+        trigram_counts.append(len(grams))
+        for gram in grams:
+            postings.setdefault(_trigram_hash(gram), []).append(food_id)
+
+    keys.sort()
+    key_blob = bytearray()
+    key_offsets = array('I')
+    key_foods = array('I')
+    for key, food_id in keys:
+        key_offsets.append(len(key_blob))
+        key_blob += key
+        key_foods.append(food_id)
+    key_offsets.append(len(key_blob))
+
+    hashes = array('I', sorted(postings))
+    posting_offsets = array('I')
+    posting_ids = array('I')
+    for h in hashes:
+        posting_offsets.append(len(posting_ids))
+        posting_ids.extend(postings[h])
+    posting_offsets.append(len(posting_ids))
+
+    sections = [foods, key_offsets.tobytes(), key_foods.tobytes(), hashes.tobytes(),
+                posting_offsets.tobytes(), posting_ids.tobytes(), trigram_counts.tobytes(),
+                bytes(key_blob), bytes(strings)]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position += -position % 4
+        offsets.append(position)
+        position += len(section)
+
+    with atomic_write(index_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(rows), len(keys), len(hashes), *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+    return len(rows)
+
+
+class FoodIndex:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, n_keys, n_hashes, *offsets = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a food index')
+        (self._foods, key_offsets, key_foods, hashes, posting_offsets, posting_ids,
+         trigram_counts, self._key_blob, self._strings) = offsets
+        view = memoryview(self._mm)
+
+        def uint32(offset, count):
+            return view[offset:offset + 4 * count].cast('I')
+
+        self._key_offsets = uint32(key_offsets, n_keys + 1)
+        self._key_foods = uint32(key_foods, n_keys)
+        self._hashes = uint32(hashes, n_hashes)
+        self._posting_offsets = uint32(posting_offsets, n_hashes + 1)
+        self._posting_ids = uint32(posting_ids, self._posting_offsets[n_hashes])
+        self._trigram_counts = uint32(trigram_counts, self.size)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, food_id):
+        uk_offset, uk_len, en_offset, en_len, *values = FOOD.unpack_from(self._mm, self._foods + FOOD.size * food_id)
+        start = self._strings
+        name_uk = self._mm[start + uk_offset:start + uk_offset + uk_len].decode()
+        name_en = self._mm[start + en_offset:start + en_offset + en_len].decode()
+        return Food(food_id, name_uk, name_en, *(round(value, 2) for value in values))
+
+    def _key(self, i):
+        start = self._key_blob
+        return self._mm[start + self._key_offsets[i]:start + self._key_offsets[i + 1]]
+
+    def _prefix(self, prefix):
+        # Двійковий пошук першого ключа >= prefix, далі — ключі з цим префіксом
+        lo, hi = 0, len(self._key_foods)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = {}
+        for i in range(lo, min(lo + PREFIX_SCAN, len(self._key_foods))):
+            key = self._key(i)
+            if not key.startswith(prefix):
+                break
+            food_id = self._key_foods[i]
+            tail = bool(food_id & TAIL_FLAG)
+            food_id &= ~TAIL_FLAG
+            # Точний збіг, потім запит як ціле слово, потім збіг з початку назви, потім коротші ключі
+            whole_word = key[len(prefix):len(prefix) + 1] in (b'', b' ')
+            rank = (key != prefix, not whole_word, tail, len(key))
+            if food_id not in matches or rank < matches[food_id]:
+                matches[food_id] = rank
+        return matches
+
+    def _fuzzy(self, query):
+        grams = trigrams(query)
+        hits = Counter()
+        for gram in grams:
+            h = _trigram_hash(gram)
+            i = bisect.bisect_left(self._hashes, h)
+            if i < len(self._hashes) and self._hashes[i] == h:
+                hits.update(self._posting_ids[self._posting_offsets[i]:self._posting_offsets[i + 1]])
+        # Частка триграм запиту в назві; за рівної — коефіцієнт Дайса, тобто коротші назви
+        scores = {}
+        for food_id, common in hits.items():
+            coverage = common / len(grams)
+            if coverage >= MIN_SIMILARITY:
+                scores[food_id] = (coverage, 2 * common / (len(grams) + self._trigram_counts[food_id]))
+        return scores
+
+    def search(self, query, limit=10):
+        query = normalize(query)
+        if not query:
+            return []
+        matches = self._prefix(query.encode())
+        found = sorted(matches, key=matches.get)[:limit]
+        if len(found) < limit:
+            scores = self._fuzzy(query)
+            found += sorted((food_id for food_id in scores if food_id not in matches),
+                            key=scores.get, reverse=True)[:limit - len(found)]
+        return [self.get(food_id) for food_id in found]
+
+    def close(self):
+        for view in (self._key_offsets, self._key_foods, self._hashes, self._posting_offsets,
+                     self._posting_ids, self._trigram_counts):
+            view.release()
+        self._mm.close()
+
+
+def open_index(csv_path, index_path):
+    # Перезбирає індекс, якщо його немає, він старіший за таблицю або іншого формату
+    try:
+        if os.path.getmtime(index_path) >= os.path.getmtime(csv_path):
+            return FoodIndex(index_path)
+    except (OSError, ValueError):
+        pass
+    build_index(csv_path, index_path)
+    return FoodIndex(index_path)
+
+
+_PORTION = re.compile(r'^(?P<query>.+?)\s+(?P<grams>\d+(?:[.,]\d+)?)\s*(?:г|гр|g)\.?$', re.IGNORECASE)
+
+
+# Найбільша порція, яку можна записати одним /eat
+MAX_PORTION_GRAMS = 5_000
+
+
+def parse_grams(text):
+    # Вага порції в грамах («150», «150,5») або None, якщо її не можна записати
+    try:
+        grams = float(text.replace(',', '.'))
+    except ValueError:
+        return None
+    if not math.isfinite(grams) or not 0 < grams <= MAX_PORTION_GRAMS:
+        return None
+    return grams
+
+
+def parse_portion(text):
+    # «гречка 150г» / «гречка 150 г» / «buckwheat 150g» → ('гречка', 150.0)
+    match = _PORTION.match((text or '').strip())
+    if match is None:
+        return None
+    grams = parse_grams(match['grams'])
+    if grams is None:
+        return None
+    return match['query'], grams
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the food search index')
+    parser.add_argument('paths', nargs='+', help='SOURCE.csv INDEX to build, or INDEX with --search')
+    parser.add_argument('--search', help='print the top matches for this query')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.search is None:
+        count = build_index(*args.paths)
+        print(f'{count} foods indexed into {args.paths[1]}', file=sys.stderr)
+        return
+    index = FoodIndex(args.paths[-1])
+    for food in index.search(args.search, args.limit):
+        print(f'{food.name_uk} / {food.name_en}: {food.kcal:g} kcal, '
+              f'P {food.protein:g} F {food.fat:g} C {food.carbs:g}')
+
+
+if __name__ == '__main__':
+    main()
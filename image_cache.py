@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+
+from aiogram.types import InputFile
+from aiogram.utils.exceptions import TypeOfFileMismatch, WrongFileIdentifier, WrongRemoteFileIdSpecified
+
+from atomic_file import atomic_write
+
+# Помилки, з якими Telegram відхиляє застарілий або чужий file_id
+STALE_FILE_ID_ERRORS = (WrongFileIdentifier, WrongRemoteFileIdSpecified, TypeOfFileMismatch)
+
+
+class ImageCache:
+    # Кеш file_id для локальних зображень: кожен файл завантажується в Telegram
+    # один раз, далі фото надсилається за file_id. Сховище — невеликий JSON
+    # з ключами «назва зображення» → {sha1 вмісту, file_id}.
+    # У пам'яті тримаються лише sha1: сам файл читається тільки тоді, коли
+    # його справді треба завантажити в Telegram.
+
+    def __init__(self, paths, store_path):
+        self.paths = paths
+        self.store_path = store_path
+        self._hashes = {}
+        self._locks = {}
+        self._ids = self._load_store()
+
+    def _load_store(self):
+        try:
+            with open(self.store_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_store(self, ids):
+        with atomic_write(self.store_path) as f:
+            json.dump(ids, f, ensure_ascii=False, indent=1)
+
+    def _hash(self, name):
+        # sha1 рахується потоково, файл цілком у пам'ять не потрапляє
+        with open(self.paths[name], 'rb') as f:
+            digest = hashlib.file_digest(f, 'sha1').hexdigest()
+        self._hashes[name] = digest
+        return digest
+
+    def _read(self, name):
+        # Вміст для завантаження; sha1 оновлюється, бо файл міг змінитися
+        with open(self.paths[name], 'rb') as f:
+            blob = f.read()
+        self._hashes[name] = hashlib.sha1(blob).hexdigest()
+        return blob
+
+    def warm(self):
+        # Синхронно рахує sha1 усіх зображень; викликати до запуску event loop
+        for name in self.paths:
+            try:
+                self._hash(name)
+            except FileNotFoundError:
+                pass
+
+    async def preload(self):
+        # Те саме, що warm(), але без блокування event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.warm)
+
+    async def _sha1(self, name):
+        digest = self._hashes.get(name)
+        if digest is None:
+            loop = asyncio.get_running_loop()
+            digest = await loop.run_in_executor(None, self._hash, name)
+        return digest
+
+    async def _blob(self, name):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read, name)
+
+    def file_id(self, name):
+        entry = self._ids.get(name)
+        if entry and entry.get('sha1') == self._hashes.get(name):
+            return entry['file_id']
+        return None
+
+    async def remember(self, name, message):
+        if not getattr(message, 'photo', None):
+            return
+        self._ids[name] = {'sha1': self._hashes[name], 'file_id': message.photo[-1].file_id}
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._save_store, dict(self._ids))
+
+    def forget(self, name):
+        self._ids.pop(name, None)
+
+    async def send(self, name, send):
+        # send(photo) — корутина, що надсилає фото (file_id або InputFile) і повертає Message.
+        # FileNotFoundError, якщо зображення немає на диску.
+        await self._sha1(name)
+        file_id = self.file_id(name)
+        if file_id:
+            try:
+                return await send(file_id)
+            except STALE_FILE_ID_ERRORS:
+                self.forget(name)
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # Поки чекали, інший запит міг уже завантажити це зображення
+            file_id = self.file_id(name)
+            if file_id:
+                return await send(file_id)
+            blob = await self._blob(name)
+            filename = os.path.basename(self.paths[name])
+            message = await send(InputFile(io.BytesIO(blob), filename=filename))
+            await self.remember(name, message)
+            return message
+
+    async def send_photo(self, bot, chat_id, name, **kwargs):
+        return await self.send(name, lambda photo: bot.send_photo(chat_id, photo, **kwargs))
@@ -0,0 +1,88 @@
+import json
+from functools import lru_cache
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Реєстр клавіатур бота. Кожна клавіатура будується один раз під час імпорту
+# і одразу серіалізується в JSON: aiogram передає рядок reply_markup у
+# Bot API як є, тож на гарячому шляху немає ні нових об'єктів, ні json.dumps.
+
+BACK_HOME = "🏠 На початок"
+
+
+def _markup(row_width, *buttons):
+    kb = InlineKeyboardMarkup(row_width=row_width)
+    kb.add(*(InlineKeyboardButton(text, callback_data=data) for text, data in buttons))
+    return kb
+
+
+def _step(back, *buttons, row_width=3):
+    return _markup(row_width, *buttons, ("⬅️ Назад", back), (BACK_HOME, "home"))
+
+
+MARKUPS = {
+    'start': _markup(3, ("🚀 Почнемо", "start_calc")),
+    'goal': _step(
+        "back_goal",
+        ("Схуднути", "goal_loss"),
+        ("Норма калорій", "goal_maintain"),
+        ("Набрати", "goal_gain"),
+        row_width=1,
+    ),
+    'gender': _step(
+        "back_gender",
+        ("Чоловік", "gender_male"),
+        ("Жінка", "gender_female"),
+        row_width=2,
+    ),
+    'age': _step("back_age"),
+    'height': _step("back_height"),
+    'weight': _step("back_weight"),
+    'activity': _step(
+        "back_activity",
+        ("Малорухливий (офісна робота)", "act_1.2"),
+        ("Легка (справи по дому)", "act_1.375"),
+        ("Помірна (3–5 тренувань/тиждень)", "act_1.55"),
+        ("Висока (6–7 тренувань/тиждень)", "act_1.725"),
+        ("Дуже висока (фізична робота + тренування)", "act_1.9"),
+        row_width=2,
+    ),
+    'result': _markup(2, ("🔄 Перерахувати", "recalc"), ("📒 Щоденник", "diary"), (BACK_HOME, "home")),
+}
+
+# Готові до відправки JSON-рядки для параметра reply_markup
+KEYBOARDS = {name: json.dumps(markup.to_python(), ensure_ascii=False) for name, markup in MARKUPS.items()}
+
+
+# Екран перерахунку: мета, стать і активність змінюються одним натисканням
+# (callback_data «edit_поле:значення»), поточні значення позначені галочкою.
+# Варіантів лише 3 × 2 × 5, тож кожна клавіатура серіалізується один раз.
+PROFILE_CHOICES = (
+    ('goal', (("Схуднути", "loss"), ("Норма", "maintain"), ("Набрати", "gain"))),
+    ('gender', (("Чоловік", "male"), ("Жінка", "female"))),
+    ('activity', (("Мінімальна", "1.2"), ("Легка", "1.375"), ("Помірна", "1.55"), ("Висока", "1.725"),
+                  ("Дуже висока", "1.9"))),
+)
+PROFILE_ROW_WIDTH = {'goal': 3, 'gender': 2, 'activity': 3}
+
+
+@lru_cache(maxsize=None)
+def profile_keyboard(goal, gender, activity):
+    current = {'goal': goal, 'gender': gender, 'activity': activity}
+    kb = InlineKeyboardMarkup()
+    for field, choices in PROFILE_CHOICES:
+        kb.row_width = PROFILE_ROW_WIDTH[field]
+        kb.add(*(InlineKeyboardButton(f"✅ {text}" if value == current[field] else text,
+                                      callback_data=f"edit_{field}:{value}") for text, value in choices))
+    kb.row(InlineKeyboardButton("📝 Заповнити анкету заново", callback_data="start_calc"))
+    kb.row(InlineKeyboardButton("📒 Щоденник", callback_data="diary"), InlineKeyboardButton(BACK_HOME, callback_data="home"))
+    return json.dumps(kb.to_python(), ensure_ascii=False)
+
+
+# Вибір продукту для /eat, коли назва неоднозначна («гречка» — суха чи варена):
+# callback_data «eat_id:грами», тож натискання одразу записує порцію
+def food_choice_keyboard(choices, grams):
+    kb = InlineKeyboardMarkup(row_width=1)
+    kb.add(*(InlineKeyboardButton(f"{name}, {kcal * grams / 100:.0f} ккал", callback_data=f"eat_{food_id}:{grams:g}")
+             for food_id, name, kcal in choices))
+    return json.dumps(kb.to_python(), ensure_ascii=False)
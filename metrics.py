@@ -0,0 +1,181 @@
+import bisect
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiogram.dispatcher.filters import StateFilter
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+# Межі кошиків гістограм затримок, секунди
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metrics:
+    # Мінімальний реєстр метрик у форматі Prometheus text exposition.
+    # Лічильники й гістограми з мітками зберігаються у словниках за кортежем
+    # значень міток; у гарячому шляху лише додавання чисел.
+
+    def __init__(self):
+        self._help = {}
+        self._label_names = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        self._help[name] = help
+        self._label_names[name] = labels
+        self._counters[name] = defaultdict(float)
+
+    def histogram(self, name, help, labels=()):
+        self._help[name] = help
+        self._label_names[name] = labels
+        self._histograms[name] = defaultdict(Histogram)
+
+    def inc(self, name, *labels, value=1):
+        self._counters[name][labels] += value
+
+    def observe(self, name, value, *labels):
+        self._histograms[name][labels].observe(value)
+
+    def add_collector(self, collect):
+        # collect() повертає [(назва, тип, довідка, значення)] на момент запиту /metrics
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for name, series in self._counters.items():
+            lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in series.items():
+                lines.append(f'{name}{_labels(self._label_names[name], labels)} {value:g}')
+        for name, series in self._histograms.items():
+            names = self._label_names[name]
+            lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in series.items():
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float('inf'),), hist.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{name}_bucket{_labels(names + ("le",), labels + (le,))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(names, labels)} {hist.sum:.6f}')
+                lines.append(f'{name}_count{_labels(names, labels)} {hist.count}')
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def instrument_bot(self, bot):
+        # Затримка кожного виклику Bot API за методом (без очікування в черзі надсилань)
+        api_request = bot.api_request
+
+        async def timed_request(method, data=None, files=None, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await api_request(method, data, files, **kwargs)
+            finally:
+                self.observe('bot_api_request_duration_seconds', time.perf_counter() - started, method)
+
+        bot.api_request = timed_request
+
+    async def handle(self, request):
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def serve(self, host, port):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+class MetricsMiddleware(BaseMiddleware):
+    # Час обробки кожного оновлення і кожного обробника, кількість оновлень
+    # за типом і переходи між станами Form (входи й виходи за станом).
+
+    def __init__(self, metrics):
+        super().__init__()
+        self.metrics = metrics
+        metrics.counter('bot_updates_total', 'Updates received by type', ('type',))
+        metrics.histogram('bot_update_duration_seconds', 'Full update processing time')
+        metrics.histogram('bot_handler_duration_seconds', 'Handler execution time', ('handler',))
+        metrics.histogram('bot_api_request_duration_seconds', 'Bot API request latency', ('method',))
+        metrics.counter('form_state_entries_total', 'Users entering an FSM state', ('state',))
+        metrics.counter('form_state_exits_total', 'Users leaving an FSM state', ('state',))
+
+    async def on_pre_process_update(self, update, data):
+        data['update_started'] = time.perf_counter()
+        for name in update.values:
+            if name != 'update_id':
+                self.metrics.inc('bot_updates_total', name)
+                break
+
+    async def on_post_process_update(self, update, results, data):
+        self.metrics.observe('bot_update_duration_seconds', time.perf_counter() - data['update_started'])
+
+    # --- повідомлення і callback: стан до/після та час обробника ---
+
+    async def _track(self, results, data):
+        started = data.get('handler_started')
+        if started is None:
+            # Жоден обробник не спрацював — стан не змінився
+            return
+        handler = data.get('callback_handler') or data['handler']
+        self.metrics.observe('bot_handler_duration_seconds', time.perf_counter() - started, handler.__name__)
+        before = data['state_before']
+        # Єдине обов'язкове читання стану — після обробника
+        after = await self.manager.dispatcher.current_state().get_state()
+        if before != after:
+            if before is not None:
+                self.metrics.inc('form_state_exits_total', before)
+            if after is not None:
+                self.metrics.inc('form_state_entries_total', after)
+
+    async def _start_handler(self, data):
+        data['handler'] = current_handler.get()
+        # Стан до обробника вже прочитав StateFilter aiogram під час перевірки фільтрів;
+        # зі сховища читаємо лише для обробників із state='*', де фільтр стану не перевірявся
+        try:
+            data['state_before'] = StateFilter.ctx_state.get()
+        except LookupError:
+            data['state_before'] = await self.manager.dispatcher.current_state().get_state()
+        data['handler_started'] = time.perf_counter()
+
+    async def on_process_message(self, message, data):
+        await self._start_handler(data)
+
+    async def on_post_process_message(self, message, results, data):
+        await self._track(results, data)
+
+    async def on_process_callback_query(self, callback, data):
+        await self._start_handler(data)
+
+    async def on_post_process_callback_query(self, callback, results, data):
+        await self._track(results, data)
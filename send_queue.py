@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+log = logging.getLogger(__name__)
+
+# Пріоритети: відповіді користувачам обганяють масові розсилки
+INTERACTIVE = 0
+BULK = 1
+
+# Пріоритет вихідних запитів поточної задачі; розсилки виставляють BULK
+send_priority = contextvars.ContextVar('send_priority', default=INTERACTIVE)
+
+# Методи Bot API, що пишуть у чат і підпадають під ліміти Telegram
+LIMITED_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendAudio', 'sendDocument', 'sendVideo', 'sendAnimation',
+    'sendVoice', 'sendVideoNote', 'sendMediaGroup', 'sendLocation', 'sendVenue', 'sendContact',
+    'sendPoll', 'sendDice', 'sendSticker', 'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup',
+})
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        # Бере токен і повертає 0 або кількість секунд, яку треба зачекати
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def is_idle(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and self.blocked_until <= self.updated
+
+
+class SendQueue:
+    # Центральна черга вихідних повідомлень.
+    # Спершу запит чекає на токен у відрі свого чату (1 повідомлення/с у
+    # приватних чатах, 20/хв у групах), потім стає в загальну чергу з
+    # пріоритетом, яку фонова задача розбирає зі швидкістю rate повідомлень/с.
+    # RetryAfter від Telegram призупиняє відповідне відро і запит повторюється.
+
+    def __init__(self, rate=30, chat_rate=1, chat_burst=3, group_rate=20 / 60, group_burst=3,
+                 max_retries=3, max_idle_chats=10_000):
+        # Ємність не менша за один токен: інакше при rate < 1 (SEND_RATE, поділений
+        # між багатьма шардами) відро ніколи не набере цілого токена
+        self.global_bucket = TokenBucket(rate, max(1, rate))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_idle_chats = max_idle_chats
+        self.chats = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._worker = None
+        # Метрики
+        self.waiting_for_chat = 0
+        self.sent = 0
+        self.retries = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def depth(self):
+        return len(self._heap) + self.waiting_for_chat
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._heap),
+            'waiting_for_chat': self.waiting_for_chat,
+            'sent': self.sent,
+            'retries': self.retries,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= self.max_idle_chats:
+                self.chats = {key: b for key, b in self.chats.items() if not b.is_idle()}
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self):
+        while True:
+            while not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            delay = self.global_bucket.take()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                future.set_result(None)
+
+    async def acquire(self, chat_id, priority=None):
+        started = time.monotonic()
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            self.waiting_for_chat += 1
+            try:
+                while True:
+                    delay = bucket.take()
+                    if not delay:
+                        break
+                    await asyncio.sleep(delay)
+            finally:
+                self.waiting_for_chat -= 1
+
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        if priority is None:
+            priority = send_priority.get()
+        heapq.heappush(self._heap, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+        waited = time.monotonic() - started
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    async def run(self, chat_id, call):
+        # call() — фабрика корутини з самим запитом до Bot API
+        for attempt in itertools.count():
+            await self.acquire(chat_id)
+            try:
+                result = await call()
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                log.warning('Flood control for chat %s, retry in %s s', chat_id, e.timeout)
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+                # Експоненційний запас понад вказаний Telegram час
+                bucket.pause(e.timeout * (1 + 0.5 * attempt))
+                continue
+            self.sent += 1
+            return result
+
+
+class QueuedBot(Bot):
+    # Bot, у якого всі надсилання в чат проходять через SendQueue
+
+    def __init__(self, *args, send_queue=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.send_queue = send_queue or SendQueue()
+
+    async def api_request(self, method, data=None, files=None, **kwargs):
+        # Сам запит до Bot API, без черги
+        return await super().request(method, data, files, **kwargs)
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if method not in LIMITED_METHODS:
+            return await self.api_request(method, data, files, **kwargs)
+
+        async def call():
+            # При повторі файл треба читати з початку
+            for input_file in (files or {}).values():
+                stream = getattr(input_file, 'file', None)
+                if stream is not None and stream.seekable():
+                    stream.seek(0)
+            return await self.api_request(method, data, files, **kwargs)
+
+        chat_id = (data or {}).get('chat_id')
+        return await self.send_queue.run(chat_id, call)
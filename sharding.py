@@ -0,0 +1,313 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import sys
+
+from aiohttp import web
+from aiogram.bot import api
+
+from update_queue import update_chat_id
+from webhook_app import SECRET_HEADER
+
+log = logging.getLogger(__name__)
+
+# Шардування за chat_id між кількома процесами.
+# Процес-приймач (Supervisor) отримує оновлення через getUpdates або вебхук
+# і пересилає кожне одному з N воркерів за chat_id, тож усі кроки анкети
+# одного користувача обробляє той самий процес і в тому самому порядку.
+# Воркер — це той самий BOT.py із SHARD_INDEX у середовищі: він читає
+# оновлення з stdin (один JSON на рядок), обробляє їх звичайним dp і
+# пише в stdout id кожного завершеного. Доки воркер не підтвердив
+# оновлення, приймач тримає його в себе: після падіння воркера воно йде
+# новому процесу ще раз, а offset getUpdates, що вже підтвердив його
+# Telegram, записується в журнал (OffsetStore) разом із непідтвердженими.
+# SIGHUP приймачу перезапускає воркери по одному без втрати оновлень.
+
+def shard_for(update, shards):
+    chat_id = update_chat_id(update)
+    if chat_id is None:
+        chat_id = update.get('update_id', 0)
+    return chat_id % shards
+
+
+class WorkerProcess:
+    # Один воркер: дочірній процес і оновлення, які він ще не підтвердив.
+    # Не більше max_in_flight таких оновлень: далі send() чекає, і разом із ним —
+    # getUpdates приймача, тож після падіння повторюється обмежена кількість
+
+    def __init__(self, index, command, env, max_in_flight=1000):
+        self.index = index
+        self.command = command
+        self.env = env
+        self.max_in_flight = max_in_flight
+        self.process = None
+        self.restarting = False
+        # update_id -> оновлення, у порядку надходження
+        self.unacked = {}
+        # update_id -> future запиту вебхука, що чекає на підтвердження
+        self.waiters = {}
+        self.acks = 0
+        self._acked = asyncio.Event()
+        self._reader = None
+
+    async def start(self):
+        if self._reader is not None:
+            # Спершу дочитуємо підтвердження попереднього процесу
+            await self._reader
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=self.env,
+        )
+        log.info('Worker %s started, pid %s', self.index, self.process.pid)
+        self._reader = asyncio.create_task(self._read_acks(self.process))
+        self.restarting = False
+        if self.unacked:
+            log.info('Worker %s: resending %s unacknowledged updates', self.index, len(self.unacked))
+        for update in self.unacked.values():
+            self.process.stdin.write(encode(update))
+        try:
+            await self.process.stdin.drain()
+        except ConnectionResetError:
+            pass
+
+    async def _read_acks(self, process):
+        async for line in process.stdout:
+            try:
+                update_id = int(line)
+            except ValueError:
+                log.warning('Worker %s: unexpected output %r', self.index, line[:100])
+                continue
+            self.unacked.pop(update_id, None)
+            self.acks += 1
+            self._acked.set()
+            waiter = self.waiters.pop(update_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def send(self, update):
+        while len(self.unacked) >= self.max_in_flight:
+            self._acked.clear()
+            await self._acked.wait()
+        self.unacked[update['update_id']] = update
+        # Воркеру, що перезапускається, оновлення перешле start()
+        if self.restarting or self.process is None or self.process.returncode is not None:
+            return
+        self.process.stdin.write(encode(update))
+        try:
+            await self.process.stdin.drain()
+        except ConnectionResetError:
+            # Воркер упав між write і drain — оновлення дочекається нового процесу
+            pass
+
+    async def stop(self, timeout):
+        # Закритий stdin означає для воркера «доробити поточне і вийти»
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+        process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.warning('Worker %s did not stop in %s s, killing it', self.index, timeout)
+            process.kill()
+            await process.wait()
+        await self._reader
+
+
+def encode(update):
+    return json.dumps(update, ensure_ascii=False).encode() + b'\n'
+
+
+class Supervisor:
+
+    def __init__(self, bot, shards, command, env=None, drain_timeout=30, offset_store=None, max_in_flight=1000):
+        self.bot = bot
+        self.offset_store = offset_store
+        self.shards = shards
+        self.drain_timeout = drain_timeout
+        self.workers = [
+            WorkerProcess(index, command, dict(env or os.environ, SHARD_INDEX=str(index), SHARDS=str(shards)),
+                          max_in_flight)
+            for index in range(shards)
+        ]
+        self.offset = None
+        self._saved = None
+        self._watchers = []
+        self._stopping = False
+        self._stopped = asyncio.Event()
+        self._poller = None
+        self._long_poll = None
+        self._runner = None
+
+    async def start(self):
+        for worker in self.workers:
+            await worker.start()
+            self._watchers.append(asyncio.create_task(self._watch(worker)))
+
+    async def _watch(self, worker):
+        # Воркер, що впав сам, піднімаємо знову; оновлення чекають у його буфері
+        while not self._stopping:
+            process = worker.process
+            code = await process.wait()
+            if self._stopping or worker.restarting or process is not worker.process:
+                await asyncio.sleep(0.1)
+                continue
+            log.error('Worker %s exited with code %s, restarting', worker.index, code)
+            worker.restarting = True
+            await asyncio.sleep(1)
+            await worker.start()
+
+    async def dispatch(self, update, wait=False):
+        # wait=True — дочекатися, доки воркер підтвердить оновлення
+        worker = self.workers[shard_for(update, self.shards)]
+        if not wait:
+            await worker.send(update)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        worker.waiters[update['update_id']] = waiter
+        try:
+            await worker.send(update)
+            await waiter
+        finally:
+            worker.waiters.pop(update['update_id'], None)
+
+    def unacked_updates(self):
+        return sorted((update for worker in self.workers for update in worker.unacked.values()),
+                      key=lambda u: u['update_id'])
+
+    def save(self):
+        # Журнал: offset і все, що воркери ще не підтвердили; лише якщо щось змінилося
+        if self.offset_store is None:
+            return
+        state = (self.offset, sum(worker.acks for worker in self.workers))
+        if state != self._saved:
+            self.offset_store.save(self.offset, self.unacked_updates())
+            self._saved = state
+
+    async def restart(self, index):
+        worker = self.workers[index]
+        worker.restarting = True
+        await worker.stop(self.drain_timeout)
+        await worker.start()
+
+    async def rolling_restart(self):
+        for index in range(self.shards):
+            await self.restart(index)
+        log.info('All %s workers restarted', self.shards)
+
+    async def stop(self):
+        # Спершу перестаємо приймати оновлення, потім даємо воркерам доробити прийняте
+        if self._stopping:
+            return
+        self._stopping = True
+        if self._long_poll is not None:
+            self._long_poll.cancel()
+        if self._poller is not None:
+            await asyncio.wait([self._poller])
+        if self._runner is not None:
+            await self._runner.cleanup()
+        for watcher in self._watchers:
+            watcher.cancel()
+        await asyncio.gather(*(worker.stop(self.drain_timeout) for worker in self.workers))
+        # Недороблене воркерами лишається в журналі для наступного запуску
+        self.save()
+        self._stopped.set()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.rolling_restart()))
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, lambda: asyncio.create_task(self.stop()))
+
+    # --- джерела оновлень ---
+
+    async def _poll(self, timeout, limit):
+        if self.offset_store is not None:
+            self.offset, pending = self.offset_store.load()
+            if pending:
+                log.info('Resuming %s updates accepted by the previous process', len(pending))
+            for update in pending:
+                await self.dispatch(update)
+        while not self._stopping:
+            # Скасовується лише сам long poll, а не розсилка вже отриманих оновлень
+            payload = {'timeout': timeout, 'limit': limit}
+            if self.offset is not None:
+                payload['offset'] = self.offset
+            self._long_poll = asyncio.ensure_future(self.bot.request(api.Methods.GET_UPDATES, payload))
+            try:
+                updates = await self._long_poll
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                log.exception('getUpdates failed')
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                if self.offset is not None and update['update_id'] < self.offset:
+                    continue
+                # Воркер із max_in_flight непідтвердженими притримує наступний getUpdates
+                await self.dispatch(update)
+                self.offset = update['update_id'] + 1
+            # До наступного запиту, який підтвердить цю пачку Telegram
+            self.save()
+        if self.offset is not None:
+            # Підтверджуємо розіслані оновлення, інакше після перезапуску Telegram віддасть їх знову;
+            # журнал із недоробленими запише stop(), коли зупиняться воркери
+            try:
+                await self.bot.request(api.Methods.GET_UPDATES, {'offset': self.offset, 'timeout': 0, 'limit': 1})
+            except Exception:
+                log.exception('Failed to confirm offset %s', self.offset)
+
+    async def run_polling(self, timeout=20, limit=100):
+        await self.start()
+        self.install_signal_handlers()
+        self._poller = asyncio.create_task(self._poll(timeout, limit))
+        await self._stopped.wait()
+
+    async def handle_webhook(self, request):
+        # Байти, а не рядки: заголовок з не-ASCII символами інакше дає TypeError (500 замість 401)
+        token = request.headers.get(SECRET_HEADER, '').encode('utf-8', 'surrogateescape')
+        if not hmac.compare_digest(token, request.app['webhook_secret'].encode()):
+            raise web.HTTPUnauthorized()
+        # Відповідаємо Telegram лише після підтвердження воркера: інакше оновлення,
+        # яке не встиг обробити воркер, що впав, загубилося б
+        await self.dispatch(await request.json(), wait=True)
+        return web.Response()
+
+    async def run_webhook(self, path, secret, host, port):
+        await self.start()
+        self.install_signal_handlers()
+        app = web.Application()
+        app['webhook_secret'] = secret
+        app.router.add_post(path, self.handle_webhook)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        # Зупинка чекає на запити, чиї оновлення ще обробляють воркери
+        await web.TCPSite(self._runner, host, port, shutdown_timeout=self.drain_timeout).start()
+        await self._stopped.wait()
+
+
+async def run_worker(queue, stream=None, acks=None):
+    # Читає оновлення з stdin і обробляє їх через UpdateQueue: оновлення одного чату —
+    # строго по черзі. Повна черга перестає читати stdin, і тиск доходить до приймача.
+    # id кожного завершеного оновлення (успішно чи ні) пише в stdout для приймача
+    acks = acks or sys.stdout.buffer
+
+    def ack(update):
+        acks.write(b'%d\n' % update['update_id'])
+        acks.flush()
+
+    queue.on_done = ack
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 24)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), stream or sys.stdin)
+    queue.start()
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        await queue.put(json.loads(line))
+    # stdin закрито: доробляємо те, що вже прийняли (час обмежує приймач)
+    await queue.drain(None)
@@ -0,0 +1,217 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from sqlite_thread import SQLiteThread
+
+log = logging.getLogger(__name__)
+
+# Запис того, у кого немає стану: віддається лише на читання
+EMPTY_RECORD = {'state': None, 'data': {}, 'bucket': {}}
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS fsm ('
+    ' chat TEXT NOT NULL, user TEXT NOT NULL,'
+    ' state TEXT, data TEXT NOT NULL, bucket TEXT NOT NULL,'
+    ' PRIMARY KEY (chat, user))'
+)
+
+
+class SQLiteStorage(BaseStorage):
+    # Сховище станів FSM у локальному файлі SQLite.
+    # Читання й запис обслуговує гарячий кеш у пам'яті; змінені записи
+    # накопичуються і скидаються на диск пакетами у фоновій задачі, тож
+    # обробники ніколи не чекають на fsync. База працює в режимі WAL, тому
+    # кілька процесів (наприклад, воркери з різними chat_id) можуть ділити один файл.
+    # У кеші лише ті, хто має стан: відсутній запис читається з диска щоразу, а
+    # чисті (вже скинуті) записи після скидання витісняються — найдавніші, коли їх
+    # більше за max_cached, і ті, до кого не звертались понад cache_ttl секунд.
+
+    def __init__(self, path, flush_interval=0.5, max_cached=10_000, cache_ttl=600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_cached = max_cached
+        self.cache_ttl = cache_ttl
+        # key -> запис у порядку останнього звернення, і час цього звернення
+        self._cache = OrderedDict()
+        self._accessed = {}
+        self._dirty = set()
+        self._sqlite = SQLiteThread(path, SCHEMA, 'fsm-sqlite')
+        self._flush_task = None
+        self._closed = False
+
+    # --- робота з диском (виконується в потоці SQLiteThread) ---
+
+    def _read(self, key):
+        row = self._sqlite.db().execute(
+            'SELECT state, data, bucket FROM fsm WHERE chat = ? AND user = ?', key
+        ).fetchone()
+        if row is None:
+            return None
+        state, data, bucket = row
+        return {'state': state, 'data': json.loads(data), 'bucket': json.loads(bucket)}
+
+    def _write(self, rows, deleted):
+        conn = self._sqlite.db()
+        with conn:
+            if rows:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO fsm (chat, user, state, data, bucket) VALUES (?, ?, ?, ?, ?)', rows
+                )
+            if deleted:
+                conn.executemany('DELETE FROM fsm WHERE chat = ? AND user = ?', deleted)
+
+    # --- гарячий кеш і фонове скидання ---
+
+    async def _record(self, chat, user, create=False):
+        # create=False — лише для читання: кого немає ні в кеші, ні на диску,
+        # отримує спільний порожній запис, який не кешується і не змінюється
+        key = tuple(map(str, self.check_address(chat=chat, user=user)))
+        record = self._cache.get(key)
+        if record is None:
+            record = await self._sqlite.run(self._read, key)
+            # Поки читали з диска, запис міг з'явитися в кеші
+            cached = self._cache.get(key)
+            if cached is not None:
+                record = cached
+            elif record is None and not create:
+                return key, EMPTY_RECORD
+            else:
+                record = record or {'state': None, 'data': {}, 'bucket': {}}
+                self._cache[key] = record
+        self._cache.move_to_end(key)
+        self._accessed[key] = time.monotonic()
+        return key, record
+
+    def _evict(self):
+        # Витісняє чисті записи від найдавніше використаних; брудні чекають скидання
+        expired = time.monotonic() - self.cache_ttl
+        for key in list(self._cache):
+            if len(self._cache) <= self.max_cached and self._accessed[key] >= expired:
+                break
+            if key not in self._dirty:
+                del self._cache[key]
+                del self._accessed[key]
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        if self._flush_task is None and not self._closed:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception('Failed to flush FSM states to %s', self.path)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows, deleted = [], []
+        for key in dirty:
+            record = self._cache.get(key)
+            if record is None or (record['state'] is None and not record['data'] and not record['bucket']):
+                deleted.append(key)
+                self._cache.pop(key, None)
+                self._accessed.pop(key, None)
+            else:
+                rows.append(key + (
+                    record['state'],
+                    json.dumps(record['data'], ensure_ascii=False),
+                    json.dumps(record['bucket'], ensure_ascii=False),
+                ))
+        try:
+            await self._sqlite.run(self._write, rows, deleted)
+        except Exception:
+            # Не втрачаємо зміни: спробуємо ще раз при наступному скиданні
+            self._dirty.update(dirty)
+            raise
+        self._evict()
+
+    async def close(self):
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await self._sqlite.close()
+        self._cache.clear()
+        self._accessed.clear()
+
+    async def wait_closed(self):
+        self._sqlite.shutdown()
+
+    # --- інтерфейс BaseStorage ---
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        _, record = await self._record(chat, user)
+        return record['state'] if record['state'] is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        _, record = await self._record(chat, user)
+        return copy.deepcopy(record['data'])
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.Optional[typing.AnyStr] = None):
+        key, record = await self._record(chat, user, create=True)
+        record['state'] = self.resolve_state(state)
+        self._mark_dirty(key)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key, record = await self._record(chat, user, create=True)
+        record['data'] = copy.deepcopy(data or {})
+        self._mark_dirty(key)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key, record = await self._record(chat, user, create=True)
+        record['data'].update(data or {}, **kwargs)
+        self._mark_dirty(key)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        _, record = await self._record(chat, user)
+        return copy.deepcopy(record['bucket'])
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key, record = await self._record(chat, user, create=True)
+        record['bucket'] = copy.deepcopy(bucket or {})
+        self._mark_dirty(key)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key, record = await self._record(chat, user, create=True)
+        record['bucket'].update(bucket or {}, **kwargs)
+        self._mark_dirty(key)
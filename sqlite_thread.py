@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SQLiteThread:
+    # Файл SQLite у режимі WAL з одним з'єднанням і одним потоком, з якого
+    # воно використовується: запити не блокують event loop, а записи одного
+    # процесу йдуть по черзі без блокувань у Python. WAL дозволяє кільком
+    # процесам (шардам) ділити той самий файл.
+    # Схема — SQL-скрипт, що виконується при першому з'єднанні.
+
+    def __init__(self, path, schema, name):
+        self.path = path
+        self.schema = schema
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def db(self):
+        # Лише з функцій, переданих у run()
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.schema)
+            self._conn = conn
+        return self._conn
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _close_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        # З'єднання закривається; потік лишається, тож run() відкриє його знову
+        await self.run(self._close_conn)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from atomic_file import atomic_write
+
+log = logging.getLogger(__name__)
+
+_IMPORTED = time.monotonic()
+
+
+def process_age():
+    # Скільки секунд тому стартував процес (разом із запуском інтерпретатора й імпортами).
+    # Поза Linux рахуємо від імпорту цього модуля.
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            started_ticks = int(f.read().rsplit(b')', 1)[1].split()[19])
+        with open('/proc/uptime', 'rb') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - started_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED
+
+
+async def set_commands_once(bot, commands, stamp_path):
+    # setMyCommands лише коли список команд змінився: хеш останнього
+    # встановленого списку зберігається локально поруч з іншими даними бота
+    digest = hashlib.sha1(json.dumps([c.to_python() for c in commands], ensure_ascii=False,
+                                     sort_keys=True).encode()).hexdigest()
+    try:
+        with open(stamp_path, encoding='utf-8') as f:
+            if f.read().strip() == digest:
+                return False
+    except FileNotFoundError:
+        pass
+    await bot.set_my_commands(commands)
+    with atomic_write(stamp_path) as f:
+        f.write(digest)
+    return True
+
+
+class StartupTimer(BaseMiddleware):
+    # Час холодного старту: від запуску процесу до готовності приймати
+    # оновлення і до першого отриманого та обробленого оновлення.
+    # Після першого оновлення middleware лише порівнює одне поле з None.
+
+    def __init__(self):
+        super().__init__()
+        self.imported = process_age()
+        self.ready = None
+        self.first_update = None
+        self.first_handled = None
+        self._warmup = None
+
+    def mark_ready(self):
+        self.ready = process_age()
+        log.info('Ready in %.0f ms (imports done at %.0f ms)', self.ready * 1000, self.imported * 1000)
+
+    async def on_pre_process_update(self, update, data):
+        if self.first_update is None:
+            self.first_update = process_age()
+
+    async def on_post_process_update(self, update, results, data):
+        if self.first_handled is None:
+            self.first_handled = process_age()
+            log.info('First update received at %.0f ms, handled at %.0f ms after process start',
+                     self.first_update * 1000, self.first_handled * 1000)
+
+    def collect(self):
+        collected = [('bot_startup_imports_seconds', 'gauge', 'Process start to BOT.py imported', self.imported)]
+        if self.ready is not None:
+            collected.append(('bot_startup_ready_seconds', 'gauge', 'Process start to ready for updates', self.ready))
+        if self.first_handled is not None:
+            collected.append(('bot_time_to_first_update_seconds', 'gauge',
+                              'Process start to the first update handled', self.first_handled))
+        return collected
+
+    def warm_up(self, *steps):
+        # Кроки, без яких бот уже може відповідати, виконуються у фоні по черзі;
+        # помилка одного не зупиняє інші
+        async def run():
+            started = time.monotonic()
+            for step in steps:
+                try:
+                    await step()
+                except Exception:
+                    log.exception('Startup step %s failed', getattr(step, '__name__', step))
+            log.info('Warm-up finished in %.0f ms', (time.monotonic() - started) * 1000)
+        self._warmup = asyncio.get_running_loop().create_task(run())
+
+    async def stop(self, timeout=5):
+        # Зупинка посеред прогріву: даємо йому доробити, а не закриваємо сесію під запитом
+        if self._warmup is not None and not self._warmup.done():
+            try:
+                await asyncio.wait_for(self._warmup, timeout)
+            except asyncio.TimeoutError:
+                log.warning('Warm-up did not finish in %s s', timeout)
@@ -0,0 +1,81 @@
+# Пакетний розрахунок (calorie_batch) має давати ті самі числа, що й
+# скалярні формули calorie_core, для кожного рядка когорти.
+#
+#   python -m pytest tests
+import csv
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from calorie_batch import OUTPUT_COLUMNS, calculate_batch, process_csv  # noqa: E402
+from calorie_core import ACTIVITY_CODES, GOALS, Profile, activity_factor, calculate_bmr, daily_calories  # noqa: E402
+
+
+def make_cohort(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'weight': np.round(rng.uniform(40, 160, rows), 1),
+        'height': np.round(rng.uniform(140, 210, rows), 1),
+        'age': rng.integers(14, 90, rows),
+        'gender': rng.choice(['male', 'female'], rows),
+        'activity': rng.choice(ACTIVITY_CODES, rows),
+        'goal': rng.choice(GOALS, rows),
+    }
+
+
+def expected(weight, height, age, gender, activity, goal):
+    profile = Profile(goal, gender, age, height, weight, activity)
+    bmr = calculate_bmr(weight, height, age, gender)
+    return bmr, bmr * activity_factor(activity), daily_calories(profile)
+
+
+def test_matches_core_row_by_row():
+    cohort = make_cohort(5000)
+    result = calculate_batch(**cohort)
+    columns = ('weight', 'height', 'age', 'gender', 'activity', 'goal')
+    for i, row in enumerate(zip(*(cohort[name].tolist() for name in columns))):
+        # До біта: порядок операцій у формулах однаковий
+        assert (result.bmr[i], result.tdee[i], result.calories[i]) == expected(*row), row
+
+
+@pytest.mark.parametrize('code', ['1.550', '1.55', 1.55, ' 1.55'])
+def test_activity_code_spelling(code):
+    result = calculate_batch([80], [180], [30], ['male'], [code], ['maintain'])
+    assert result.tdee[0] == expected(80.0, 180.0, 30, 'male', '1.55', 'maintain')[1]
+
+
+@pytest.mark.parametrize('code', ['1.5', 'high', ''])
+def test_unknown_activity_code(code):
+    with pytest.raises(ValueError, match='Unknown activity code'):
+        calculate_batch([80], [180], [30], ['male'], [code], ['maintain'])
+
+
+def test_csv_round_trip(tmp_path):
+    rows = [
+        {'id': '1', 'weight': '80', 'height': '180', 'age': '30', 'gender': 'male', 'activity': '1.55', 'goal': 'loss'},
+        {'id': '2', 'weight': '62.5', 'height': '165', 'age': '41', 'gender': 'female', 'activity': '1.200',
+         'goal': 'maintain'},
+        {'id': '3', 'weight': '95', 'height': '190', 'age': '25', 'gender': 'male', 'activity': '1.9', 'goal': 'gain'},
+    ]
+    src, dst = tmp_path / 'cohort.csv', tmp_path / 'targets.csv'
+    with open(src, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    # Шматки по два рядки: останній шматок неповний
+    assert process_csv(src, dst, chunk_size=2) == len(rows)
+
+    with open(dst, newline='', encoding='utf-8') as f:
+        out = list(csv.DictReader(f))
+    assert [row['id'] for row in out] == ['1', '2', '3']
+    for row in out:
+        bmr, tdee, calories = expected(float(row['weight']), float(row['height']), int(row['age']), row['gender'],
+                                       str(float(row['activity'])), row['goal'])
+        assert (row['bmr'], row['tdee'], row['calories']) == (f'{bmr:.2f}', f'{tdee:.2f}', f'{calories:.0f}')
+    assert list(out[0])[-len(OUTPUT_COLUMNS):] == list(OUTPUT_COLUMNS)
@@ -0,0 +1,59 @@
+# Кеші FoodDiary: обмежені за розміром і не віддають застарілого, коли
+# той самий файл щоденника пишуть кілька процесів (воркери шардів).
+#
+#   python -m pytest tests
+import asyncio
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from calorie_core import Profile  # noqa: E402
+from food_diary import Entry, FoodDiary  # noqa: E402
+
+BREAD = Entry('хліб', 250.0, 8.0, 3.0, 48.0)
+PROFILE = Profile('maintain', 'female', 30, 165.0, 60.0, 'moderate')
+
+
+def test_shared_diary_sees_other_workers_writes(tmp_path):
+    path = str(tmp_path / 'diary.sqlite3')
+
+    async def scenario():
+        # Дві копії — як два воркери: користувач пише в особистому чаті й у групі
+        private, group = FoodDiary(path, 'UTC', shared=True), FoodDiary(path, 'UTC', shared=True)
+        try:
+            assert (await group.totals(1))[0].count == 0
+            assert await group.target(1) is None
+            await private.add(1, BREAD)
+            await private.save_profile(1, PROFILE, 2000.0)
+            day, week = await group.totals(1)
+            assert (day.count, week.kcal) == (1, 250.0)
+            assert await group.target(1) == 2000.0
+            assert await group.profile(1) == PROFILE
+            # Власні записи кешу не скидають
+            day, _ = await group.add(1, BREAD)
+            assert (day.count, day.kcal) == (2, 500.0)
+        finally:
+            await private.close()
+            await group.close()
+
+    asyncio.run(scenario())
+
+
+def test_caches_are_bounded(tmp_path):
+    async def scenario():
+        diary = FoodDiary(str(tmp_path / 'diary.sqlite3'), 'UTC', max_cached=3)
+        try:
+            for user in range(10):
+                # Промахи (None) теж кешуються — і теж витісняються
+                assert await diary.target(user) is None
+                assert await diary.profile(user) is None
+                await diary.totals(user)
+            assert list(diary._targets) == [7, 8, 9]
+            assert len(diary._profiles) == 3
+            assert len(diary._totals) == 3
+        finally:
+            await diary.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,64 @@
+# MetricsMiddleware рахує переходи між станами, читаючи стан зі сховища
+# лише раз на повідомлення — після обробника; стан до нього дає StateFilter.
+#
+#   python -m pytest tests
+import asyncio
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+
+from metrics import Metrics, MetricsMiddleware  # noqa: E402
+
+
+class CountingStorage(MemoryStorage):
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        self.reads += 1
+        return await super().get_state(chat=chat, user=user, default=default)
+
+
+def message_update(update_id, text):
+    return types.Update(**{'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': 1, 'type': 'private'}, 'from': {'id': 1, 'is_bot': False, 'first_name': 'T'},
+    }})
+
+
+def test_state_transitions_read_state_once_per_message():
+    async def scenario():
+        storage = CountingStorage()
+        dp = Dispatcher(Bot('123456:TEST'), storage=storage)
+        metrics = Metrics()
+        dp.middleware.setup(MetricsMiddleware(metrics))
+
+        @dp.message_handler(commands=['start'], state='*')
+        async def start(message: types.Message):
+            await dp.current_state().set_state('Form:age')
+
+        @dp.message_handler(state='Form:age')
+        async def age(message: types.Message):
+            await dp.current_state().set_state('Form:weight')
+
+        Dispatcher.set_current(dp)
+        Bot.set_current(dp.bot)
+        await asyncio.create_task(dp.process_update(message_update(1, '/start')))
+        reads = storage.reads
+        await asyncio.create_task(dp.process_update(message_update(2, '30')))
+        return metrics, reads, storage.reads - reads
+
+    metrics, start_reads, age_reads = asyncio.run(scenario())
+    # Обробник із state='*': фільтр стану не читав, тож до і після — два читання
+    assert start_reads == 2
+    # Звичайний обробник: читання StateFilter і одне після обробника
+    assert age_reads == 2
+    assert 'form_state_exits_total{state="Form:age"} 1' in metrics.render()
+    assert 'form_state_entries_total{state="Form:weight"} 1' in metrics.render()
@@ -0,0 +1,81 @@
+# Supervisor проти фейкових воркерів: оновлення, яке воркер не підтвердив,
+# не губиться — ні коли воркер падає, ні коли приймач зупиняється.
+#
+#   python -m pytest tests
+import asyncio
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from sharding import Supervisor  # noqa: E402
+from update_queue import OffsetStore  # noqa: E402
+
+# Воркер: записує id отриманих оновлень у файл і підтверджує їх; на CRASH_ID
+# перший процес падає, не підтвердивши його, на HANG_ID — зависає
+WORKER = '''
+import json, os, sys, time
+log, marker = sys.argv[1], sys.argv[2]
+for line in sys.stdin:
+    update_id = json.loads(line)['update_id']
+    if update_id == {crash} and not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    if update_id == {hang}:
+        time.sleep(60)
+    with open(log, 'a') as f:
+        f.write(f'{{update_id}}\\n')
+    sys.stdout.write(f'{{update_id}}\\n')
+    sys.stdout.flush()
+'''
+
+
+def make_supervisor(tmp_path, crash=0, hang=0, **kwargs):
+    log = tmp_path / 'handled'
+    command = [sys.executable, '-c', WORKER.format(crash=crash, hang=hang), str(log), str(tmp_path / 'crashed')]
+    return Supervisor(None, 1, command, **kwargs), log
+
+
+def handled_ids(log):
+    return [int(line) for line in log.read_text().split()] if log.exists() else []
+
+
+def update(update_id):
+    return {'update_id': update_id, 'message': {'chat': {'id': 1}}}
+
+
+def test_crashed_worker_gets_unacknowledged_updates_again(tmp_path):
+    supervisor, log = make_supervisor(tmp_path, crash=3)
+
+    async def scenario():
+        await supervisor.start()
+        for update_id in range(1, 7):
+            await supervisor.dispatch(update(update_id))
+        worker = supervisor.workers[0]
+        while worker.unacked:
+            await asyncio.sleep(0.05)
+        await supervisor.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 30))
+    # 4-6 уже лежали в stdin процесу, що впав на 3, — новий процес отримує їх знову
+    assert handled_ids(log) == [1, 2, 3, 4, 5, 6]
+
+
+def test_unfinished_updates_stay_in_the_journal(tmp_path):
+    store = OffsetStore(str(tmp_path / 'offset'))
+    supervisor, log = make_supervisor(tmp_path, hang=2, drain_timeout=0.5, offset_store=store)
+
+    async def scenario():
+        await supervisor.start()
+        supervisor.offset = 4
+        for update_id in range(1, 4):
+            await supervisor.dispatch(update(update_id))
+        while 1 not in handled_ids(log):
+            await asyncio.sleep(0.05)
+        await supervisor.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 30))
+    offset, pending = store.load()
+    assert offset == 4
+    assert [u['update_id'] for u in pending] == [2, 3]
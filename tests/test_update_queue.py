@@ -0,0 +1,150 @@
+# UpdatePoller + UpdateQueue проти фейкового getUpdates: повільний чат не
+# притримує отримання оновлень інших чатів, а прийняте, але не оброблене,
+# переживає падіння процесу через журнал OffsetStore.
+#
+#   python -m pytest tests
+import asyncio
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.dispatcher.webhook import SendMessage  # noqa: E402
+from aiohttp import ClientSession, web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from update_queue import OffsetStore, UpdatePoller, UpdateQueue  # noqa: E402
+from webhook_app import SECRET_HEADER, QueuedRequestHandler, create_app  # noqa: E402
+
+SLOW_CHAT = 1
+SLOW_SECONDS = 3
+
+
+class FakeTelegram:
+    # getUpdates як у Bot API: offset підтверджує все, що менше за нього
+
+    def __init__(self, updates):
+        self.updates = list(updates)
+        self.confirmed = 0
+
+    async def request(self, method, payload):
+        assert method == 'getUpdates'
+        self.confirmed = max(self.confirmed, payload.get('offset', 0))
+        batch = [u for u in self.updates if u['update_id'] >= self.confirmed][:payload['limit']]
+        if not batch:
+            await asyncio.sleep(payload['timeout'])
+        return batch
+
+
+def message_update(update_id, chat_id):
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': 'hi',
+        'chat': {'id': chat_id, 'type': 'private'}, 'from': {'id': chat_id, 'is_bot': False, 'first_name': 'T'},
+    }}
+
+
+def make_dispatcher(handled, reply=False):
+    dp = Dispatcher(Bot('123456:TEST'))
+
+    @dp.message_handler()
+    async def handler(message: types.Message):
+        if message.chat.id == SLOW_CHAT:
+            await asyncio.sleep(SLOW_SECONDS)
+        handled.append(message.message_id)
+        if reply:
+            return SendMessage(message.chat.id, f'done {message.message_id}')
+
+    return dp
+
+
+def test_slow_chat_does_not_block_polling(tmp_path):
+    updates = [message_update(1, SLOW_CHAT)] + [message_update(i, 100 + i) for i in range(2, 301)]
+
+    async def scenario():
+        handled = []
+        telegram = FakeTelegram(updates)
+        poller = UpdatePoller(telegram, UpdateQueue(make_dispatcher(handled)), OffsetStore(tmp_path / 'offset'),
+                              timeout=0.05, limit=100, drain_timeout=SLOW_SECONDS * 2)
+        task = asyncio.create_task(poller.run())
+        started = time.perf_counter()
+        while len(handled) < 299 and time.perf_counter() - started < SLOW_SECONDS - 1:
+            await asyncio.sleep(0.05)
+        fast = len(handled)
+        poller.stop()
+        await task
+        return fast, handled, telegram.confirmed
+
+    fast, handled, confirmed = asyncio.run(scenario())
+    # Усі швидкі чати оброблено, поки перше оновлення ще виконується
+    assert fast == 299
+    assert sorted(handled) == list(range(1, 301))
+    assert confirmed == 301
+
+
+def test_accepted_updates_survive_a_crash(tmp_path):
+    updates = [message_update(1, SLOW_CHAT), message_update(2, SLOW_CHAT), message_update(3, 7)]
+    store = OffsetStore(tmp_path / 'offset')
+
+    async def crash():
+        handled = []
+        poller = UpdatePoller(FakeTelegram(updates), UpdateQueue(make_dispatcher(handled)), store, timeout=0.05)
+        task = asyncio.create_task(poller.run())
+        while 3 not in handled:
+            await asyncio.sleep(0.01)
+        # Журнал оновлюється після кожного long poll
+        await asyncio.sleep(0.2)
+        # Падіння: ні drain, ні фінального збереження
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return handled
+
+    async def restart(telegram):
+        handled = []
+        poller = UpdatePoller(telegram, UpdateQueue(make_dispatcher(handled)), store, timeout=0.05,
+                              drain_timeout=SLOW_SECONDS * 3)
+        task = asyncio.create_task(poller.run())
+        await asyncio.sleep(0.2)
+        poller.stop()
+        await task
+        return handled
+
+    assert asyncio.run(crash()) == [3]
+    offset, pending = store.load()
+    assert offset == 4
+    assert [update['update_id'] for update in pending] == [1, 2]
+    # Telegram уже не віддасть підтверджені оновлення — їх обробляє новий процес із журналу
+    assert asyncio.run(restart(FakeTelegram(updates))) == [1, 2]
+    assert store.load() == (4, [])
+
+
+def test_webhook_goes_through_the_queue():
+    # Два оновлення одного чату: друге чекає на перше, відповідь обробника — у відповіді на запит
+    async def scenario():
+        handled = []
+        queue = UpdateQueue(make_dispatcher(handled, reply=True), concurrency=4)
+        app = create_app('secret', queue)
+        app.router.add_post('/hook', QueuedRequestHandler)
+        queue.start()
+        async with TestServer(app) as server, ClientSession() as session:
+            async def post(update, secret='secret'):
+                async with session.post(server.make_url('/hook'), json=update, headers={SECRET_HEADER: secret}) as r:
+                    return r.status, await r.json() if r.status == 200 else None
+
+            slow = asyncio.create_task(post(message_update(1, SLOW_CHAT)))
+            await asyncio.sleep(0.1)
+            second = asyncio.create_task(post(message_update(2, SLOW_CHAT)))
+            other = await post(message_update(3, 7))
+            assert handled == [3]
+            results = await asyncio.gather(slow, second)
+            denied = await post(message_update(4, 7), secret='wrong')
+        await queue.drain(1)
+        return handled, other, results, denied
+
+    handled, other, results, denied = asyncio.run(scenario())
+    assert handled == [3, 1, 2]
+    assert other == (200, {'method': 'sendMessage', 'chat_id': 7, 'text': 'done 3'})
+    assert [body['text'] for _, body in results] == ['done 1', 'done 2']
+    assert denied == (401, None)
@@ -0,0 +1,201 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+log = logging.getLogger(__name__)
+
+# Трейс оновлення, яке зараз обробляється; дочірні задачі успадковують його разом з контекстом
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Методи сховища FSM, через які aiogram читає і пише стани
+STORAGE_METHODS = ('get_state', 'get_data', 'set_state', 'set_data', 'update_data', 'reset_state',
+                   'reset_data', 'finish', 'get_bucket', 'set_bucket', 'update_bucket', 'reset_bucket')
+
+
+class Trace:
+    __slots__ = ('trace_id', 'update_id', 'kind', 'started', 'spans')
+
+    def __init__(self, update):
+        self.trace_id = os.urandom(8).hex()
+        self.update_id = update.update_id
+        self.kind = next((name for name in update.values if name != 'update_id'), 'unknown')
+        self.started = time.perf_counter()
+        # (тип, назва, початок від старту трейсу, тривалість), секунди
+        self.spans = []
+
+    def to_python(self, duration):
+        return {
+            'trace': self.trace_id,
+            'update_id': self.update_id,
+            'type': self.kind,
+            'duration_ms': round(duration * 1000, 3),
+            'spans': [{'kind': kind, 'name': name, 'start_ms': round(start * 1000, 3), 'ms': round(took * 1000, 3)}
+                      for kind, name, start, took in self.spans],
+        }
+
+
+def instrument(obj, kind, names, name_arg=None):
+    # Обгортає async-методи об'єкта так, щоб кожен виклик під час трейсу
+    # записувався як спан; поза трейсом — лише одне читання ContextVar.
+    # name_arg — позиційний аргумент, що стає назвою спану (метод Bot API, назва зображення)
+    for name in names:
+        method = getattr(obj, name)
+
+        async def traced(*args, _method=method, _name=name, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return await _method(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await _method(*args, **kwargs)
+            finally:
+                label = str(args[name_arg]) if name_arg is not None and len(args) > name_arg else _name
+                trace.spans.append((kind, label, started - trace.started, time.perf_counter() - started))
+
+        setattr(obj, name, traced)
+
+
+class StackSampler:
+    # Семплер стеку потоку event loop: раз на interval окремий потік знімає
+    # стек через sys._current_frames() і кладе в кільцевий буфер за останні
+    # keep секунд. Профіль повільного оновлення — це семпли за його час.
+    # Оновлення обробляються конкурентно, тож у профіль потрапляє все,
+    # що loop робив у цей проміжок; спани трейсу показують, що з цього — наше.
+
+    def __init__(self, interval=0.005, keep=60):
+        self.interval = interval
+        self.samples = deque(maxlen=int(keep / interval))
+        self._target = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), tuple(reversed(stack))))
+
+    def folded(self, since, until):
+        # Формат «folded stacks» (корінь;...;вершина кількість) для flamegraph.pl / speedscope
+        counts = Counter(stack for at, stack in list(self.samples) if since <= at <= until)
+        return [f"{';'.join(stack)} {count}" for stack, count in counts.most_common()]
+
+
+class TracingMiddleware(BaseMiddleware):
+    # Трейси оновлень: ID трейсу, спани обробника, сховища, Bot API і читання
+    # зображень. Оновлення, довші за slow секунд, разом зі стеками з семплера
+    # пишуться JSON-рядком у файл, що ротується.
+    # Вимкнений трейсинг (middleware не встановлено) нічого не коштує.
+
+    def __init__(self, path, slow=0.5, sample_interval=0.005, max_bytes=5 * 1024 ** 2, backup_count=3):
+        super().__init__()
+        self.slow = slow
+        self.sampler = StackSampler(sample_interval) if sample_interval else None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.slow_log = logging.getLogger(f'{__name__}.slow')
+        self.slow_log.addHandler(handler)
+        self.slow_log.setLevel(logging.INFO)
+        self.slow_log.propagate = False
+
+    def instrument(self, bot=None, storage=None, images=None, extra=()):
+        # Bot.request — разом з очікуванням у черзі надсилань, api_request — сам HTTP-запит
+        if bot is not None:
+            instrument(bot, 'api', ('request',), name_arg=0)
+            if hasattr(bot, 'api_request'):
+                instrument(bot, 'http', ('api_request',), name_arg=0)
+        if storage is not None:
+            instrument(storage, 'storage', [name for name in STORAGE_METHODS if hasattr(storage, name)])
+        if images is not None:
+            instrument(images, 'io', ('_sha1', '_blob'), name_arg=0)
+        for obj, kind, names in extra:
+            instrument(obj, kind, names)
+
+    def start_sampler(self):
+        # Викликати з потоку event loop
+        if self.sampler is not None and self.sampler._thread is None:
+            self.sampler.start()
+
+    async def on_pre_process_update(self, update, data):
+        trace = Trace(update)
+        data['trace'] = trace
+        data['trace_token'] = current_trace.set(trace)
+
+    async def on_post_process_update(self, update, results, data):
+        trace = data['trace']
+        current_trace.reset(data['trace_token'])
+        finished = time.perf_counter()
+        duration = finished - trace.started
+        log.debug('Trace %s: update %s (%s) in %.1f ms, %d spans',
+                  trace.trace_id, trace.update_id, trace.kind, duration * 1000, len(trace.spans))
+        if duration >= self.slow:
+            record = trace.to_python(duration)
+            if self.sampler is not None:
+                record['profile'] = {'interval_ms': self.sampler.interval * 1000,
+                                     'stacks': self.sampler.folded(trace.started, finished)}
+            self.slow_log.info(json.dumps(record, ensure_ascii=False))
+            log.warning('Slow update %s (%s): %.0f ms, trace %s',
+                        trace.update_id, trace.kind, duration * 1000, trace.trace_id)
+
+    # --- час самого обробника (data тут свій для кожного обробника, трейс беремо з контексту) ---
+
+    async def _start_handler(self, data):
+        data['traced_handler'] = current_handler.get()
+        data['traced_handler_started'] = time.perf_counter()
+
+    async def _end_handler(self, data):
+        started = data.get('traced_handler_started')
+        trace = current_trace.get()
+        if started is not None and trace is not None:
+            handler = data['traced_handler']
+            trace.spans.append(('handler', getattr(handler, '__name__', str(handler)),
+                                started - trace.started, time.perf_counter() - started))
+
+    async def on_process_message(self, message, data):
+        await self._start_handler(data)
+
+    async def on_post_process_message(self, message, results, data):
+        await self._end_handler(data)
+
+    async def on_process_callback_query(self, callback, data):
+        await self._start_handler(data)
+
+    async def on_post_process_callback_query(self, callback, results, data):
+        await self._end_handler(data)
+
+    async def on_process_inline_query(self, query, data):
+        await self._start_handler(data)
+
+    async def on_post_process_inline_query(self, query, results, data):
+        await self._end_handler(data)
+
+    async def on_process_my_chat_member(self, member, data):
+        await self._start_handler(data)
+
+    async def on_post_process_my_chat_member(self, member, results, data):
+        await self._end_handler(data)
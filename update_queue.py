@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import signal
+from collections import deque
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot import api
+from aiogram.dispatcher.webhook import BaseResponse
+
+from atomic_file import atomic_write
+
+log = logging.getLogger(__name__)
+
+# Поля оновлення, з яких береться чат (або користувач, якщо чату немає)
+CHAT_PATHS = (('chat',), ('message', 'chat'), ('from',), ('user',))
+
+
+def update_chat_id(update):
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        for path in CHAT_PATHS:
+            node = value
+            for name in path:
+                node = node.get(name) if isinstance(node, dict) else None
+            if isinstance(node, dict) and 'id' in node:
+                return node['id']
+    return None
+
+
+class UpdateQueue:
+    # Обробка оновлень з обмеженнями: не більше concurrency обробників
+    # одночасно і не більше max_pending прийнятих, але ще не оброблених
+    # оновлень. Коли черга заповнена, put() чекає — і разом із ним чекає
+    # getUpdates, тож під час сплеску оновлення лишаються в Telegram, а не в пам'яті.
+    # Оновлення одного чату обробляються строго по черзі, різних чатів — паралельно:
+    # чат потрапляє в _ready лише тоді, коли попереднє його оновлення завершено.
+
+    def __init__(self, dp, concurrency=32, max_pending=1000):
+        self.dp = dp
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.processed = 0
+        self.failed = 0
+        self._slots = asyncio.Semaphore(max_pending)
+        self._chats = {}
+        self._ready = asyncio.Queue()
+        self._pending = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # update_id -> future запиту вебхука, що чекає на обробку (process)
+        self._waiters = {}
+        # Викликається з кожним завершеним оновленням; так воркер шарду підтверджує їх приймачу
+        self.on_done = None
+        self._workers = []
+
+    def start(self):
+        # Як start_polling: обробники звертаються до Dispatcher.get_current()
+        Dispatcher.set_current(self.dp)
+        Bot.set_current(self.dp.bot)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def in_flight(self):
+        return len(self._chats)
+
+    def pending_updates(self):
+        # Прийняті, але ще не оброблені оновлення (разом із тими, що в роботі), за id
+        return sorted((update for chat in self._chats.values() for update in chat), key=lambda u: u['update_id'])
+
+    async def process(self, update):
+        # Для вебхука: put() і очікування, доки оновлення оброблено. Повертає першу
+        # відповідь обробника (BaseResponse), щоб віддати її у відповіді на запит Telegram
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[update['update_id']] = waiter
+        try:
+            await self.put(update)
+            return await waiter
+        finally:
+            self._waiters.pop(update['update_id'], None)
+
+    async def put(self, update):
+        await self._slots.acquire()
+        update_id = update['update_id']
+        chat_id = update_chat_id(update)
+        # Оновлення без чату нічим не впорядковані між собою
+        key = chat_id if chat_id is not None else ('update', update_id)
+        self._pending.add(update_id)
+        self._idle.clear()
+        chat = self._chats.get(key)
+        if chat is None:
+            self._chats[key] = deque([update])
+            self._ready.put_nowait(key)
+        else:
+            chat.append(update)
+
+    async def _work(self):
+        while True:
+            key = await self._ready.get()
+            chat = self._chats[key]
+            update = chat[0]
+            # Окрема задача — окремий контекст: ContextVars aiogram (поточні Update,
+            # Message, чат) і трейсу не переходять до наступного оновлення воркера
+            reply = await asyncio.create_task(self._process(update))
+            chat.popleft()
+            self._pending.discard(update['update_id'])
+            if self.on_done is not None:
+                self.on_done(update)
+            waiter = self._waiters.get(update['update_id'])
+            if waiter is not None and not waiter.done():
+                waiter.set_result(reply)
+            self._slots.release()
+            if chat:
+                self._ready.put_nowait(key)
+            else:
+                del self._chats[key]
+            if not self._pending:
+                self._idle.set()
+
+    async def _process(self, update):
+        # Відповідь для запиту вебхука або None
+        try:
+            results = await self.dp.process_update(types.Update(**update))
+            responses = [response for response in results or () if isinstance(response, BaseResponse)]
+            reply = responses.pop(0) if responses and update['update_id'] in self._waiters else None
+            # Як і в polling aiogram: решту відповідей, повернутих обробниками, надсилаємо самі
+            for response in responses:
+                await response.execute_response(self.dp.bot)
+            self.processed += 1
+            return reply
+        except Exception:
+            self.failed += 1
+            log.exception('Update %s failed', update.get('update_id'))
+            return None
+
+    async def drain(self, timeout):
+        # Доробляє прийняті оновлення; False, якщо не встигли за timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            log.warning('%s updates were not processed in %s s', len(self._pending), timeout)
+            drained = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        # Запити вебхука з недообробленими оновленнями обриваються: Telegram доставить їх знову
+        for waiter in self._waiters.values():
+            waiter.cancel()
+        return drained
+
+    def collect(self):
+        return [
+            ('update_queue_pending', 'gauge', 'Updates accepted but not processed yet', len(self._pending)),
+            ('update_queue_chats_in_flight', 'gauge', 'Chats with an update being processed', self.in_flight),
+            ('update_queue_processed_total', 'counter', 'Updates processed', self.processed),
+            ('update_queue_failed_total', 'counter', 'Updates whose handler raised', self.failed),
+        ]
+
+
+class OffsetStore:
+    # Журнал getUpdates у локальному файлі: перший рядок — offset, з якого
+    # просити нові оновлення, далі по рядку JSON на кожне прийняте, але ще
+    # не оброблене оновлення. Telegram їх уже не поверне (offset підтвердив
+    # їх), тож після перевикладки чи падіння їх обробляє новий процес.
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        # (offset або None, список не оброблених оновлень)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                offset, *lines = f.read().split('\n')
+            return int(offset), [json.loads(line) for line in lines if line]
+        except (FileNotFoundError, ValueError):
+            return None, []
+
+    def save(self, offset, pending=()):
+        if offset is None:
+            return
+        with atomic_write(self.path) as f:
+            f.write(str(offset))
+            for update in pending:
+                f.write('\n' + json.dumps(update, ensure_ascii=False))
+
+
+class UpdatePoller:
+    # Long polling з UpdateQueue замість dp.start_polling.
+    # Кожен getUpdates просить оновлення після найбільшого прийнятого, тож
+    # повільний чат не тримає отримання для інших: черга наповнюється до
+    # max_pending, а далі put() притримує наступний запит (тиск назад).
+    # Offset підтверджує Telegram усе прийняте, тому перед кожним запитом
+    # прийняті, але не оброблені оновлення записуються в OffsetStore;
+    # наступний процес починає з них. Падіння процесу може повторити
+    # оновлення, завершені після останнього запису журналу (не більше ніж за
+    # один long poll), але не губить жодного.
+    # stop() (SIGTERM/SIGINT) перериває лише очікування нових оновлень; прийняті
+    # доробляються впродовж drain_timeout, а недороблені лишаються в журналі.
+
+    def __init__(self, bot, queue, offset_store, timeout=20, limit=100, drain_timeout=30):
+        self.bot = bot
+        self.queue = queue
+        self.offset_store = offset_store
+        self.timeout = timeout
+        self.limit = limit
+        self.drain_timeout = drain_timeout
+        # Найбільший прийнятий id і стан на момент останнього запису журналу
+        self.highest = None
+        self._saved = None
+        self._stopping = False
+        self._long_poll = None
+
+    def stop(self):
+        if not self._stopping:
+            log.info('Stopping: no new updates, finishing %s accepted ones', len(self.queue))
+        self._stopping = True
+        if self._long_poll is not None:
+            self._long_poll.cancel()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+
+    @property
+    def offset(self):
+        return self.highest + 1 if self.highest is not None else None
+
+    def save(self):
+        # Лише якщо щось змінилося: прийнято нові оновлення або якісь завершилися
+        state = (self.offset, self.queue.processed + self.queue.failed)
+        if state != self._saved:
+            self.offset_store.save(self.offset, self.queue.pending_updates())
+            self._saved = state
+
+    async def _wait(self, awaitable):
+        # Очікування, яке stop() може перервати; None, якщо перервано
+        self._long_poll = asyncio.ensure_future(awaitable)
+        try:
+            return await self._long_poll
+        except asyncio.CancelledError:
+            if not self._stopping:
+                raise
+            return None
+
+    async def run(self):
+        offset, pending = self.offset_store.load()
+        if offset is not None:
+            self.highest = offset - 1
+        self.queue.start()
+        if pending:
+            log.info('Resuming %s updates accepted by the previous process', len(pending))
+        for update in pending:
+            await self.queue.put(update)
+        while not self._stopping:
+            payload = {'timeout': self.timeout, 'limit': self.limit}
+            if self.offset is not None:
+                payload['offset'] = self.offset
+            try:
+                updates = await self._wait(self.bot.request(api.Methods.GET_UPDATES, payload))
+            except Exception:
+                log.exception('getUpdates failed')
+                await asyncio.sleep(1)
+                continue
+            if updates is None:
+                break
+            for update in updates:
+                if self._stopping:
+                    # Решта пачки не підтверджена і дістанеться наступному процесу
+                    break
+                if self.highest is not None and update['update_id'] <= self.highest:
+                    continue
+                # Повна черга притримує наступний getUpdates
+                await self.queue.put(update)
+                self.highest = update['update_id']
+            # До наступного запиту, який підтвердить цю пачку Telegram; після порожнього
+            # long poll — щоб після падіння не повторювати вже оброблене
+            self.save()
+
+        await self.queue.drain(self.drain_timeout)
+        if self.offset is not None:
+            try:
+                await self.bot.request(api.Methods.GET_UPDATES, {'offset': self.offset, 'timeout': 0, 'limit': 1})
+            except Exception:
+                log.exception('Failed to confirm offset %s', self.offset)
+        self.save()
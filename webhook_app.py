@@ -0,0 +1,43 @@
+import hmac
+
+from aiohttp import web
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+
+# Заголовок, у якому Telegram передає secret_token, вказаний у setWebhook
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+SECRET_KEY = 'WEBHOOK_SECRET'
+QUEUE_KEY = 'UPDATE_QUEUE'
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    # Приймає оновлення лише з правильним секретним токеном у заголовку
+
+    def check_secret(self):
+        # Байти, а не рядки: заголовок з не-ASCII символами інакше дає TypeError (500 замість 401)
+        token = self.request.headers.get(SECRET_HEADER, '').encode('utf-8', 'surrogateescape')
+        if not hmac.compare_digest(token, self.request.app[SECRET_KEY].encode()):
+            raise web.HTTPUnauthorized()
+
+    async def post(self):
+        self.check_secret()
+        return await super().post()
+
+
+class QueuedRequestHandler(SecretTokenRequestHandler):
+    # Оновлення вебхука обробляє та сама UpdateQueue, що й у polling: обмеження
+    # одночасних обробників, порядок у межах чату і drain при зупинці.
+    # Telegram отримує відповідь лише після обробки, тож оновлення, не
+    # оброблене до зупинки, він доставить знову. Кількість запитів у дорозі
+    # обмежує max_connections у setWebhook.
+
+    async def post(self):
+        self.check_secret()
+        reply = await self.request.app[QUEUE_KEY].process(await self.request.json())
+        return reply.get_web_response() if reply else web.Response(text='ok')
+
+
+def create_app(secret, queue=None):
+    app = web.Application()
+    app[SECRET_KEY] = secret
+    app[QUEUE_KEY] = queue
+    return app